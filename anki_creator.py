@@ -1,11 +1,20 @@
+import asyncio
 import genanki
+import hashlib
 import os
 import re
-import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import html_compact
 
 MODEL_ID_TRANSLATION = 1607392319
-MODEL_ID_LISTENING = 1607392320
-MODEL_ID_CLOZE = 1607392321
+# Note types whose fields changed get a new ID and name: Anki keeps the old ones
+# (and their notes) as they are instead of hitting a schema conflict on import.
+# These IDs must never change again: every deck already imported refers to them.
+# Template and CSS changes keep the ID; only new or removed fields need a new note type.
+MODEL_ID_LISTENING = 1607392325       # + AudioSlow (was 1607392320)
+MODEL_ID_CLOZE = 1607392323           # + WordAudio (was 1607392321)
 
 CARD_CSS = """
 .card { font-family: arial; font-size: 20px; text-align: center; color: black; background-color: white; }
@@ -16,7 +25,7 @@ CARD_CSS = """
 .hint { color: #7f8c8d; font-size: 16px; margin-bottom: 10px; }
 .image-container img { max-height: 300px; max-width: 100%; margin-top: 15px; border-radius: 8px; }
 .explanation { font-size: 16px; color: #555; text-align: left; margin-top: 20px; padding: 10px; border-top: 1px dashed #ccc; background-color: #f9f9f9; border-radius: 5px; }
-"""
+""" + html_compact.COMPACT_CSS
 # --- TRANSLATION MODEL  ---
 # Front: Source Text
 # Back: Target Text + Audio + Image + IPA
@@ -46,12 +55,14 @@ MODEL_TRANSLATION = genanki.Model(
 # --- LISTENING MODEL (Oral Comprehension) ---
 # Front: Audio (Auto-play) + Icon
 # Back: Target Text + Source Text + IPA
+# AudioSlow: optional slowed-down replay of the same sentence
 MODEL_LISTENING = genanki.Model(
     MODEL_ID_LISTENING,
-    'AutoAnki: Listening',
+    'AutoAnki: Listening (slow audio)',
     fields=[
         {'name': 'Question'}, {'name': 'Answer'}, 
-        {'name': 'Audio'}, {'name': 'Image'}, {'name': 'IPA'}, {'name': 'Explanation'}
+        {'name': 'Audio'}, {'name': 'Image'}, {'name': 'IPA'}, {'name': 'Explanation'},
+        {'name': 'AudioSlow'}
     ],
     templates=[{
         'name': 'Listening Card',
@@ -60,9 +71,11 @@ MODEL_LISTENING = genanki.Model(
         <div class="audio">{{Audio}}</div>
         {{type:Answer}}
         ''',
+        # The slow clip is on the back only: every sound on a side autoplays
         'afmt': '''
         {{FrontSide}}
         <hr id="answer">
+        {{#AudioSlow}}<div class="audio">🐢 {{AudioSlow}}</div>{{/AudioSlow}}
         {{type:Answer}}
         <div class="ipa">[{{IPA}}]</div>
         <div class="translation"><small>({{Question}})</small></div>
@@ -75,34 +88,36 @@ MODEL_LISTENING = genanki.Model(
 # --- CLOZE MODEL ---
 MODEL_CLOZE = genanki.Model(
     MODEL_ID_CLOZE,
-    'AutoAnki: Cloze',
+    'AutoAnki: Cloze (word audio)',
     fields=[
         {'name': 'Text'},
         {'name': 'Extra'},
         {'name': 'Translation'},
         {'name': 'Explanation'},
+        {'name': 'WordAudio'},
     ],
     templates=[{
         'name': 'Cloze Card',
         'qfmt': '{{cloze:Text}}\n<br><div class="hint" style="margin-top: 20px; font-style: italic; color: #888;">({{Translation}})</div><br>\n{{type:cloze:Text}}',
-        'afmt': '{{cloze:Text}}\n<br><br>\n{{type:cloze:Text}}\n<hr>\n<div class="translation">{{Translation}}</div>\n<br>\n{{Extra}}\n<div class="explanation">{{Explanation}}</div>',
+        'afmt': '{{cloze:Text}}\n<br><br>\n{{type:cloze:Text}}\n<hr>\n<div class="translation">{{Translation}}</div>\n<br>\n{{Extra}}\n<div class="audio">{{WordAudio}}</div>\n<div class="explanation">{{Explanation}}</div>',
     }],
     css=CARD_CSS,
     model_type=genanki.Model.CLOZE
 )
 
 # --- DECLENSION MODEL ---
-MODEL_ID_DECLENSION = 1607392322
+MODEL_ID_DECLENSION = 1607392324      # + WordAudio (was 1607392322)
 MODEL_DECLENSION = genanki.Model(
     MODEL_ID_DECLENSION,
-    'AutoAnki: Declension',
+    'AutoAnki: Declension (word audio)',
     fields=[
         {'name': 'Sentence'},
         {'name': 'Translation'},
         {'name': 'RootWord'},
         {'name': 'CaseInfo'},
         {'name': 'Audio'},
-        {'name': 'Explanation'}
+        {'name': 'Explanation'},
+        {'name': 'WordAudio'}
     ],
     templates=[{
         'name': 'Declension Card',
@@ -120,6 +135,7 @@ MODEL_DECLENSION = genanki.Model(
         <hr>
         <div class="word" style="font-size: 24px; color: #27ae60;">{{CaseInfo}}</div>
         <div class="audio">{{Audio}}</div>
+        <div class="audio">{{WordAudio}}</div>
         <div class="explanation">{{Explanation}}</div>
         '''
     }],
@@ -131,30 +147,42 @@ def _sanitize_filename(text: str) -> str:
     clean = re.sub(r'[^a-zA-Z0-9]', '', text).lower()
     return clean[:20]
 
-def create_flashcard(audio_bytes: bytes, image_bytes: bytes, front_text: str, back_text: str, ipa_text: str = "", translation_text: str = "", explanation_text: str = "", mode: str = "translation", root_word: str = "", case_info: str = "") -> dict:
+def create_flashcard(audio_bytes: bytes | memoryview, image_bytes: bytes, front_text: str, back_text: str, ipa_text: str = "", translation_text: str = "", explanation_text: str = "", mode: str = "translation", root_word: str = "", case_info: str = "", word_audio_bytes: bytes | memoryview = None, slow_audio_bytes: bytes | memoryview = None) -> dict:
     """
     Create a flashcard selecting the right model based on 'mode'.
+    'word_audio_bytes' is the isolated target word clip (cloze & declension only).
+    'slow_audio_bytes' is the slowed-down sentence audio (listening only).
     """
     clean_name = _sanitize_filename(back_text if mode == "translation" else front_text)
-    rand_id = random.randint(1000,9999)
+    # Each card writes into its own directory: the names depend only on the content,
+    # so two jobs building the same card must not remove each other's files
+    media_dir = tempfile.mkdtemp(prefix="anki_media_")
     media_paths = []
-    
-    audio_filename = f"anki_audio_{clean_name}_{rand_id}.mp3"
+
+    def write_media(kind: str, data, extension: str) -> str:
+        filename = f"anki_{kind}_{clean_name}_{hashlib.sha256(data).hexdigest()[:16]}.{extension}"
+        path = os.path.join(media_dir, filename)
+        with open(path, "wb") as f:
+            f.write(data)
+        media_paths.append(path)
+        return filename
+
     audio_field = ""
     if audio_bytes:
-        with open(audio_filename, "wb") as f:
-            f.write(audio_bytes)
-        media_paths.append(audio_filename)
-        audio_field = f"[sound:{audio_filename}]"
+        audio_field = f"[sound:{write_media('audio', audio_bytes, 'mp3')}]"
+
+    word_audio_field = ""
+    if word_audio_bytes:
+        word_audio_field = f"[sound:{write_media('word', word_audio_bytes, 'mp3')}]"
+
+    slow_audio_field = ""
+    if slow_audio_bytes:
+        slow_audio_field = f"[sound:{write_media('slow', slow_audio_bytes, 'mp3')}]"
 
     # Handle Image (Only for Translation usually, but logic is generic)
     image_field = ""
     if image_bytes:
-        image_filename = f"anki_img_{clean_name}_{rand_id}.jpg"
-        with open(image_filename, "wb") as f:
-            f.write(image_bytes)
-        media_paths.append(image_filename)
-        image_field = f'<img src="{image_filename}">'
+        image_field = f'<img src="{write_media("img", image_bytes, "jpg")}">'
 
     if mode == "listening":
         target_model = MODEL_LISTENING
@@ -176,13 +204,15 @@ def create_flashcard(audio_bytes: bytes, image_bytes: bytes, front_text: str, ba
         # Extra field: The word to guess (source) + Audio (maybe?)
         extra_field = f"<div class='translation'>{front_text}</div><div class='audio'>{audio_field}</div>"
 
-        fields = [cloze_text, extra_field, translation_text, explanation_text]
+        fields = [cloze_text, extra_field, translation_text, explanation_text, word_audio_field]
     elif mode == "declension":
         # Declension Mode Fields: Sentence, Translation, RootWord, CaseInfo, Audio, Explanation
         # back_text here is expected to be the masked sentence with {{c1::word}} already formatted or we format it.
         # Let's assume main.py formats it to {{c1::word}}.
         
-        fields = [back_text, translation_text, root_word, case_info, audio_field, explanation_text]
+        fields = [back_text, translation_text, root_word, case_info, audio_field, explanation_text, word_audio_field]
+    elif mode == "listening":
+        fields = [front_text, back_text, audio_field, image_field, ipa_text, explanation_text, slow_audio_field]
     else:
         fields = [front_text, back_text, audio_field, image_field, ipa_text, explanation_text]
 
@@ -196,8 +226,22 @@ def create_flashcard(audio_bytes: bytes, image_bytes: bytes, front_text: str, ba
         "media_paths": media_paths 
     }
 
+def remove_media(media_paths) -> None:
+    """
+    Removes the temporary media files written by create_flashcard (and their directories).
+    """
+    for file_path in media_paths:
+        try:
+            os.remove(file_path)
+            os.rmdir(os.path.dirname(file_path))
+        except OSError: pass
+
+def _unique_media(media_paths) -> list:
+    # Identical content gets the same name: package each media file once
+    return list({os.path.basename(path): path for path in media_paths}.values())
+
 def create_deck(flashcards_data: list, deck_name: str, output_file: str):
-    deck = genanki.Deck(random.randrange(1 << 30, 1 << 31), deck_name)
+    deck = genanki.Deck(_stable_deck_id(deck_name), deck_name)
     all_media_files = []
 
     for item in flashcards_data:
@@ -205,13 +249,79 @@ def create_deck(flashcards_data: list, deck_name: str, output_file: str):
         all_media_files.extend(item['media_paths'])
 
     package = genanki.Package(deck)
-    package.media_files = all_media_files
+    package.media_files = _unique_media(all_media_files)
     package.write_to_file(output_file)
     
     # Clean uptemp files
-    for file_path in all_media_files:
-        try:
-            os.remove(file_path)
-        except OSError: pass
+    remove_media(all_media_files)
+
+    print(f"✅ Deck created: {output_file}")
+
+def partition(flashcards_data: list, max_cards: int = None, max_media_bytes: int = None) -> list:
+    """
+    Splits the cards, in order, into parts of at most `max_cards` cards and `max_media_bytes`
+    bytes of media (a single card bigger than the limit gets its own part).
+    """
+    parts = [[]]
+    part_bytes = 0
+    for item in flashcards_data:
+        item_bytes = sum(os.path.getsize(path) for path in item['media_paths'] if os.path.exists(path))
+        full = (max_cards and len(parts[-1]) >= max_cards) or \
+               (max_media_bytes and parts[-1] and part_bytes + item_bytes > max_media_bytes)
+        if full:
+            parts.append([])
+            part_bytes = 0
+        parts[-1].append(item)
+        part_bytes += item_bytes
+    return [part for part in parts if part]
+
+def _stable_deck_id(deck_name: str) -> int:
+    # Same name, same deck id: re-importing a deck or part updates it instead of creating a new deck
+    return (1 << 30) + int(hashlib.sha256(deck_name.encode("utf-8")).hexdigest(), 16) % (1 << 30)
+
+def _write_part(notes: list, media_files: list, deck_name: str, output_file: str) -> str:
+    deck = genanki.Deck(_stable_deck_id(deck_name), deck_name)
+    for note in notes:
+        deck.add_note(note)
+    package = genanki.Package(deck)
+    package.media_files = media_files
+    package.write_to_file(output_file)
+    return output_file
+
+async def create_deck_parts(flashcards_data: list, deck_name: str, output_file: str,
+                            max_cards: int = None, max_media_bytes: int = None, workers: int = None) -> list:
+    """
+    Like create_deck, but split into several packages (see partition): subdecks
+    "<deck_name>::Part 01", ... written to "<output_file>_part01.apkg", ... in parallel
+    worker processes, awaited without blocking the event loop. A part that fails
+    doesn't prevent the others from being written.
+    Returns the written parts as (file, number of cards) pairs.
+    """
+    parts = partition(flashcards_data, max_cards, max_media_bytes)
+    base, extension = os.path.splitext(output_file)
+    jobs = []
+    for number, part in enumerate(parts, 1):
+        jobs.append((
+            [item['note'] for item in part],
+            _unique_media(path for item in part for path in item['media_paths']),
+            f"{deck_name}::Part {number:02d}",
+            f"{base}_part{number:02d}{extension or '.apkg'}",
+        ))
+
+    written = []
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=min(len(jobs), workers or os.cpu_count() or 1)) as executor:
+        results = await asyncio.gather(
+            *(loop.run_in_executor(executor, _write_part, *job) for job in jobs),
+            return_exceptions=True
+        )
+    for result, (notes, _, part_name, part_file) in zip(results, jobs):
+        if isinstance(result, BaseException):
+            print(f"❌ Could not write '{part_name}' ({part_file}): {result}")
+        else:
+            written.append((result, len(notes)))
+
+    remove_media(path for item in flashcards_data for path in item['media_paths'])
 
-    print(f"✅ Deck created: {output_file}")
\ No newline at end of file
+    print(f"✅ Deck created in {len(written)}/{len(jobs)} parts: {', '.join(path for path, _ in written)}")
+    return written
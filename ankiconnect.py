@@ -0,0 +1,159 @@
+"""
+Output backend that pushes the cards straight into a running Anki through the
+AnkiConnect add-on, instead of writing an .apkg to import by hand.
+
+Notes are sent in large `addNotes` batches; their media are uploaded concurrently
+with `storeMediaFile` while the next cards are still being generated. The note types
+are created from the same genanki models as the .apkg output (MODEL_TRANSLATION, ...).
+"""
+import asyncio
+import base64
+import os
+import aiohttp
+import genanki
+
+import anki_creator
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+API_VERSION = 6
+
+class AnkiConnectError(Exception):
+    """AnkiConnect answered with an error (or could not be reached)."""
+
+class AnkiConnectClient:
+    def __init__(self, url: str = DEFAULT_URL):
+        self.url = url
+        self._session = None
+
+    async def invoke(self, action: str, **params):
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        payload = {"action": action, "version": API_VERSION, "params": params}
+        try:
+            async with self._session.post(self.url, json=payload) as response:
+                reply = await response.json(content_type=None)
+        except aiohttp.ClientError as e:
+            await self.close()
+            raise AnkiConnectError(f"Cannot reach AnkiConnect at {self.url}: {e}") from e
+
+        if reply.get("error") is not None:
+            raise AnkiConnectError(f"{action}: {reply['error']}")
+        return reply.get("result")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+def model_definition(model: genanki.Model) -> dict:
+    """
+    createModel parameters for a genanki model.
+    """
+    return {
+        "modelName": model.name,
+        "inOrderFields": [field["name"] for field in model.fields],
+        "css": model.css,
+        "isCloze": model.model_type == genanki.Model.CLOZE,
+        "cardTemplates": [
+            {"Name": template["name"], "Front": template["qfmt"], "Back": template["afmt"]}
+            for template in model.templates
+        ],
+    }
+
+def note_definition(note: genanki.Note, deck_name: str) -> dict:
+    """
+    addNotes entry for a genanki note.
+    """
+    return {
+        "deckName": deck_name,
+        "modelName": note.model.name,
+        "fields": {field["name"]: value for field, value in zip(note.model.fields, note.fields)},
+        "tags": list(note.tags),
+        "options": {"allowDuplicate": False},
+    }
+
+class AnkiConnectSink:
+    """
+    Receives flashcards (the dicts returned by anki_creator.create_flashcard) as they
+    are produced and pushes them to Anki in batches.
+    """
+
+    def __init__(self, deck_name: str, url: str = DEFAULT_URL, batch_size: int = 100, media_concurrency: int = 8):
+        self.deck_name = deck_name
+        self.client = AnkiConnectClient(url)
+        self.batch_size = batch_size
+        self._media_slots = asyncio.Semaphore(media_concurrency)
+        self._pending = []         # (note, media upload tasks)
+        self._sends = []           # batches being sent
+        self._models_ready = set()
+        self._deck_ready = False
+        self.added = 0
+        self.rejected = 0
+        self.media_files = []
+
+    async def _ensure_deck_and_model(self, model: genanki.Model):
+        if not self._deck_ready:
+            await self.client.invoke("createDeck", deck=self.deck_name)
+            self._deck_ready = True
+        if model.name not in self._models_ready:
+            existing = await self.client.invoke("modelNames")
+            if model.name not in existing:
+                await self.client.invoke("createModel", **model_definition(model))
+            self._models_ready.add(model.name)
+
+    async def _store_media(self, path: str):
+        async with self._media_slots:
+            with open(path, "rb") as f:
+                data = base64.b64encode(f.read()).decode("ascii")
+            await self.client.invoke("storeMediaFile", filename=os.path.basename(path), data=data)
+
+    async def add(self, flashcard: dict):
+        """
+        Queues one card: its media upload starts right away, the note is sent with the next batch.
+        """
+        note = flashcard["note"]
+        await self._ensure_deck_and_model(note.model)
+        uploads = [asyncio.create_task(self._store_media(path)) for path in flashcard["media_paths"]]
+        self.media_files.extend(flashcard["media_paths"])
+        self._pending.append((note, uploads))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def _send(self, batch: list, previous):
+        # Notes go in once their media are in the collection, and after the previous
+        # batch (so duplicates across batches are seen by canAddNotes)
+        await asyncio.gather(*(task for _, uploads in batch for task in uploads))
+        if previous is not None:
+            await previous
+
+        notes = [note_definition(note, self.deck_name) for note, _ in batch]
+        # addNotes fails as a whole if one note is rejected (e.g. a duplicate): filter first
+        allowed = await self.client.invoke("canAddNotes", notes=notes)
+        notes = [note for note, ok in zip(notes, allowed) if ok]
+        self.rejected += len(batch) - len(notes)
+        if notes:
+            results = await self.client.invoke("addNotes", notes=notes)
+            self.added += sum(1 for note_id in results if note_id)
+
+    async def flush(self):
+        """
+        Sends the queued notes in the background, so generation goes on meanwhile.
+        """
+        if self._pending:
+            batch, self._pending = self._pending, []
+            previous = self._sends[-1] if self._sends else None
+            self._sends.append(asyncio.create_task(self._send(batch, previous)))
+
+    async def close(self):
+        """
+        Sends the last batch, then removes the temporary media files.
+        """
+        try:
+            await self.flush()
+            await asyncio.gather(*self._sends)
+        finally:
+            await self.client.close()
+            anki_creator.remove_media(self.media_files)
+
+        rejected = f", {self.rejected} rejected (duplicates?)" if self.rejected else ""
+        print(f"✅ Sent to Anki: {self.added} notes in '{self.deck_name}'{rejected}")
@@ -2,12 +2,15 @@
 import streamlit as st
 import asyncio
 import os
+import re
 import time
 import llm_call
 import tts_call
 import image_api
 import ipa
 import anki_creator
+import html_compact
+import events
 
 # Page Configuration
 st.set_page_config(
@@ -68,6 +71,26 @@ async def generate_deck(topic, source, target, count, mode, explain, progress_ba
 
     flashcards = []
     total = len(vocab_list)
+
+    # IPA runs in the process pool while the other stages run
+    ipa_texts = [card.get('target', '') if mode in ("translation", "listening") else "" for card in vocab_list]
+    ipa_task = asyncio.create_task(ipa.get_engine().transcribe_async(ipa_texts, target))
+
+    # Word lists: synthesize all target words over shared TTS sessions up front
+    batched_audio = []
+    slow_audio = []
+    if mode in ("translation", "listening"):
+        status_text.text(f"🔊 Synthesizing {total} audio clips...")
+        target_texts = [card.get('target', '') for card in vocab_list]
+        if mode == "listening":
+            # Slowed-down replay synthesized alongside the normal audio
+            batched_audio, variants = await asyncio.gather(
+                tts_call.generate_audio_batch(target_texts, target),
+                tts_call.generate_audio_variants(target_texts, target)
+            )
+            slow_audio = variants["slow"]
+        else:
+            batched_audio = await tts_call.generate_audio_batch(target_texts, target)
     
     # 2. Process each card
     for i, card in enumerate(vocab_list, 1):
@@ -80,14 +103,15 @@ async def generate_deck(topic, source, target, count, mode, explain, progress_ba
         else:
             c_source = card.get('source', 'Unknown')
             c_target = card.get('target', 'Unknown')
-            
-        progress_bar.progress(i / total, text=f"Creating: {c_source} -> {c_target}")
+
 
         # Defaults
         front = ""
         back = ""
         translation_text = ""
         audio = None
+        word_audio = None
+        slow_audio_bytes = None
         image = None
         text_for_ipa = ""
         explanation_html = ""
@@ -110,13 +134,13 @@ async def generate_deck(topic, source, target, count, mode, explain, progress_ba
             
             # Audio & Explanation
             raw_sentence = card['sentence_pl_masked'].replace("___", declined_word)
-            audio = await tts_call.generate_audio(raw_sentence, target)
+            audio, timings = await tts_call.generate_audio_with_timings(raw_sentence, target)
+            word_audio = tts_call.extract_word_clip(audio, timings, declined_word)
             
-            explanation_html = await llm_call.generate_explanation(
-                sentence=raw_sentence,
+            explanation_html = await llm_call.generate_declension_explanation(
+                card,
                 source_lang=source,
-                target_lang=target,
-                mode="declension"
+                target_lang=target
             )
             extra_kwargs = {"root_word": root_word, "case_info": case_info}
 
@@ -124,25 +148,26 @@ async def generate_deck(topic, source, target, count, mode, explain, progress_ba
             front = card['source']
             back = card['target']
             text_for_ipa = card['target']
-            audio = await tts_call.generate_audio(card['target'], target)
+            audio = batched_audio[i - 1]
+            slow_audio_bytes = slow_audio[i - 1]
 
         elif mode == "cloze":
             front = card['source']
             back = card['target']
             translation_text = card.get('translation', '')
             clean_sentence = card['target'].replace("<", "").replace(">", "")
-            audio = await tts_call.generate_audio(clean_sentence, target)
+            audio, timings = await tts_call.generate_audio_with_timings(clean_sentence, target)
+            hidden_word = re.search(r'<(.*?)>', card['target'])
+            if hidden_word:
+                word_audio = tts_call.extract_word_clip(audio, timings, hidden_word.group(1))
 
         else: # Translation
             front = card['source']
             back = card['target']
             text_for_ipa = card['target']
-            audio = await tts_call.generate_audio(back, target)
+            audio = batched_audio[i - 1]
             image_query = card['source']
-            # Run image fetch in a thread/sync way if needed, assuming image_api is sync
-            # image_api.get is likely sync based on name, checking main.py... yes it is called directly
-            # But in Streamlit we might want to be careful. It's fine.
-            image = image_api.get(image_query)
+            image = await image_api.get_async(image_query)
 
         # --- General Explanation Logic ---
         if mode != "declension":
@@ -155,11 +180,13 @@ async def generate_deck(topic, source, target, count, mode, explain, progress_ba
                     target_lang=target
                 )
 
+        explanation_html = html_compact.compact(explanation_html)
+
         # IPA
         ipa_transcription = ""
         if text_for_ipa:
             # IPA generation might fail if espeak not installed, but it handles exceptions.
-            ipa_transcription = ipa.get_ipa(text_for_ipa, target)
+            ipa_transcription = (await ipa_task)[i - 1]
 
         # Create Card Object
         flashcard = anki_creator.create_flashcard(
@@ -168,9 +195,12 @@ async def generate_deck(topic, source, target, count, mode, explain, progress_ba
             translation_text=translation_text,
             explanation_text=explanation_html,
             mode=mode,
+            word_audio_bytes=word_audio,
+            slow_audio_bytes=slow_audio_bytes,
             **extra_kwargs
         )
         flashcards.append(flashcard)
+        events.emit("card_done", target_lang=target, index=i, total=total, label=f"{c_source} -> {c_target}")
         
         # Rate Limiting
         if explain:
@@ -182,6 +212,7 @@ async def generate_deck(topic, source, target, count, mode, explain, progress_ba
     filename = f"anki_{safe_topic[:30]}_{target}.apkg"
     
     anki_creator.create_deck(flashcards, deck_name=deck_name, output_file=filename)
+    llm_call.release_prompt_caches()
     return filename
 
 # Button
@@ -193,6 +224,12 @@ if st.button("🚀 Generate Deck", type="primary"):
     else:
         progress_bar = st.progress(0, text="Starting...")
         status_text = st.empty()
+
+        # The progress bar follows the same events as `main.py --events jsonl`
+        def on_event(event):
+            if event["event"] == "card_done":
+                progress_bar.progress(event["index"] / event["total"], text=f"Created: {event['label']}")
+        events.subscribe(on_event)
         
         try:
             filename = asyncio.run(generate_deck(topic, source_lang, target_lang, count, mode, explain, progress_bar, status_text))
@@ -215,4 +252,6 @@ if st.button("🚀 Generate Deck", type="primary"):
             st.error(f"An error occurred: {e}")
             import traceback
             st.code(traceback.format_exc())
+        finally:
+            events.unsubscribe(on_event)
 
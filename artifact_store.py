@@ -0,0 +1,302 @@
+"""
+Shared on-disk store for the generated artifacts (TTS audio, images, IPA, explanations).
+
+Content-addressed: each payload is stored once under objects/<sha256[:2]>/<sha256>,
+and a SQLite index maps request keys (kind + request parameters) to payloads.
+Writes go through a temp file + atomic rename, and index updates are serialized with
+a file lock, so several processes, or machines sharing the directory over NFS, can
+use the same store: whatever one worker generated, the others read back.
+
+Enabled with --store DIR (or the AUTOANKI_STORE environment variable).
+
+Lookups and writes can be batched (get_many / put_many: one index connection and one
+lock for the whole batch); the *_async methods run them in a thread, for coroutines.
+
+Garbage collection:
+  python artifact_store.py gc DIR [--max-age-days N] [--max-size-mb N]
+  python artifact_store.py stats DIR
+"""
+import argparse
+import asyncio
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+# Keys per SELECT ... IN (...) (SQLite limits the number of query parameters)
+LOOKUP_CHUNK = 500
+
+# Objects without index entry are only removed by gc after this delay (a writer may be
+# between writing the object and indexing it)
+ORPHAN_GRACE_SECONDS = 3600
+
+STATS = {"hits": 0, "misses": 0, "writes": 0}
+
+class ArtifactStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._index_path = os.path.join(root, "index.sqlite")
+        self._lock_path = os.path.join(root, "index.lock")
+        with self._locked(), self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                " key TEXT PRIMARY KEY, kind TEXT NOT NULL, digest TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS artifacts_digest ON artifacts (digest)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        A connection to the index, in a transaction, closed on exit.
+        """
+        # No WAL: it needs shared memory, which network file systems don't provide
+        with contextlib.closing(sqlite3.connect(self._index_path, timeout=30)) as db, db:
+            yield db
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    @staticmethod
+    def make_key(kind: str, parts) -> str:
+        raw = json.dumps([kind, parts], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, kind: str, parts) -> bytes | None:
+        """
+        The payload stored for this request, or None.
+        """
+        return self.get_many(kind, [parts])[0]
+
+    def get_many(self, kind: str, parts_list: list) -> list:
+        """
+        The payloads stored for several requests (None where there is none), with one
+        index lookup and one last-used update for the whole batch.
+        """
+        keys = [self.make_key(kind, parts) for parts in parts_list]
+        results = [None] * len(keys)
+        with self._connect() as db:
+            digests = {}
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                digests.update(db.execute(
+                    f"SELECT key, digest FROM artifacts WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                ))
+
+            used = []
+            for i, key in enumerate(keys):
+                if key not in digests:
+                    continue
+                try:
+                    with open(self._object_path(digests[key]), "rb") as f:
+                        results[i] = f.read()
+                except FileNotFoundError:
+                    # Collected meanwhile
+                    continue
+                used.append((time.time(), key))
+            STATS["hits"] += len(used)
+            STATS["misses"] += len(keys) - len(used)
+
+            if used:
+                # Index updates are serialized, like the writes
+                with contextlib.suppress(sqlite3.OperationalError), self._locked():
+                    db.executemany("UPDATE artifacts SET last_used = ? WHERE key = ?", used)
+        return results
+
+    def _write_object(self, data: bytes | memoryview) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Temp file in the same directory, so the rename is atomic
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.remove(temp_path)
+                raise
+        return digest
+
+    def put(self, kind: str, parts, data: bytes | memoryview):
+        self.put_many(kind, [(parts, data)])
+
+    def put_many(self, kind: str, items: list):
+        """
+        Stores several (parts, payload) pairs, indexed under a single lock. Payloads may
+        be memoryviews (slices of a batched TTS session): they are hashed and written as is.
+        """
+        rows = []
+        for parts, data in items:
+            digest = self._write_object(data)
+            now = time.time()
+            rows.append((self.make_key(kind, parts), kind, digest, len(data), now, now))
+        if not rows:
+            return
+        with self._locked(), self._connect() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO artifacts (key, kind, digest, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        STATS["writes"] += len(rows)
+
+    def delete(self, kind: str, parts):
+        """
+        Drops the index entry of this request (its object is left to gc).
+        """
+        with self._locked(), self._connect() as db:
+            db.execute("DELETE FROM artifacts WHERE key = ?", (self.make_key(kind, parts),))
+
+    def get_text(self, kind: str, parts) -> str | None:
+        data = self.get(kind, parts)
+        return data.decode("utf-8") if data is not None else None
+
+    def put_text(self, kind: str, parts, text: str):
+        self.put(kind, parts, text.encode("utf-8"))
+
+    def get_json(self, kind: str, parts):
+        data = self.get(kind, parts)
+        return json.loads(data) if data is not None else None
+
+    def put_json(self, kind: str, parts, value):
+        self.put(kind, parts, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    # Same operations for coroutines: the index and object I/O runs in a thread
+
+    async def get_async(self, kind: str, parts) -> bytes | None:
+        return await asyncio.to_thread(self.get, kind, parts)
+
+    async def get_many_async(self, kind: str, parts_list: list) -> list:
+        return await asyncio.to_thread(self.get_many, kind, parts_list)
+
+    async def put_async(self, kind: str, parts, data: bytes | memoryview):
+        await asyncio.to_thread(self.put, kind, parts, data)
+
+    async def put_many_async(self, kind: str, items: list):
+        await asyncio.to_thread(self.put_many, kind, items)
+
+    async def delete_async(self, kind: str, parts):
+        await asyncio.to_thread(self.delete, kind, parts)
+
+    async def get_text_async(self, kind: str, parts) -> str | None:
+        return await asyncio.to_thread(self.get_text, kind, parts)
+
+    async def put_text_async(self, kind: str, parts, text: str):
+        await asyncio.to_thread(self.put_text, kind, parts, text)
+
+    async def get_json_async(self, kind: str, parts):
+        return await asyncio.to_thread(self.get_json, kind, parts)
+
+    async def put_json_async(self, kind: str, parts, value):
+        await asyncio.to_thread(self.put_json, kind, parts, value)
+
+    def stats(self) -> dict:
+        with self._connect() as db:
+            rows = db.execute("SELECT kind, COUNT(*), SUM(size) FROM artifacts GROUP BY kind").fetchall()
+        return {kind: {"entries": count, "bytes": size or 0} for kind, count, size in rows}
+
+    def gc(self, max_age_days: float = None, max_bytes: int = None) -> dict:
+        """
+        Drops the entries not used for `max_age_days`, then the least recently used ones
+        until the referenced payloads fit in `max_bytes`, and deletes the unreferenced objects.
+        """
+        removed_entries = 0
+        with self._locked(), self._connect() as db:
+            indexed_before = {digest for (digest,) in db.execute("SELECT DISTINCT digest FROM artifacts")}
+
+            if max_age_days is not None:
+                removed_entries += db.execute(
+                    "DELETE FROM artifacts WHERE last_used < ?", (time.time() - max_age_days * 86400,)
+                ).rowcount
+
+            if max_bytes is not None:
+                # Distinct objects, most recently used first
+                rows = db.execute(
+                    "SELECT digest, MAX(size), MAX(last_used) AS used FROM artifacts GROUP BY digest ORDER BY used DESC"
+                ).fetchall()
+                total, evicted = 0, []
+                for digest, size, _ in rows:
+                    total += size
+                    if total > max_bytes:
+                        evicted.append((digest,))
+                removed_entries += db.executemany("DELETE FROM artifacts WHERE digest = ?", evicted).rowcount
+
+            referenced = {digest for (digest,) in db.execute("SELECT DISTINCT digest FROM artifacts")}
+
+            removed_objects, freed = 0, 0
+            cutoff = time.time() - ORPHAN_GRACE_SECONDS
+            for directory, _, files in os.walk(os.path.join(self.root, "objects")):
+                for name in files:
+                    if name in referenced:
+                        continue
+                    path = os.path.join(directory, name)
+                    with contextlib.suppress(FileNotFoundError):
+                        # Objects never indexed (or temp files) may belong to a writer in progress
+                        if name not in indexed_before and os.path.getmtime(path) >= cutoff:
+                            continue
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                        removed_objects += 1
+
+        return {"entries": removed_entries, "objects": removed_objects, "bytes": freed}
+
+_store = None
+_store_checked = False
+
+def open_store(root: str) -> ArtifactStore:
+    global _store, _store_checked
+    _store = ArtifactStore(root)
+    _store_checked = True
+    print(f"🗃️  Artifact store: '{root}'.")
+    return _store
+
+def get_store() -> ArtifactStore | None:
+    """
+    The store of this process: opened with open_store, else from AUTOANKI_STORE, else None.
+    """
+    global _store_checked
+    if not _store_checked:
+        _store_checked = True
+        if os.environ.get("AUTOANKI_STORE"):
+            open_store(os.environ["AUTOANKI_STORE"])
+    return _store
+
+def print_report():
+    if _store is not None and (STATS["hits"] or STATS["writes"]):
+        print(f"🗃️  Artifact store: {STATS['hits']} reused, {STATS['writes']} stored.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintenance of an AutoAnki artifact store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    gc_parser = subparsers.add_parser("gc", help="Remove old entries and unreferenced objects.")
+    gc_parser.add_argument("root")
+    gc_parser.add_argument("--max-age-days", type=float, help="Drop the entries not used for that long.")
+    gc_parser.add_argument("--max-size-mb", type=float, help="Then keep only the most recently used payloads up to that size.")
+    stats_parser = subparsers.add_parser("stats", help="Entries and size by kind.")
+    stats_parser.add_argument("root")
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.root)
+    if args.command == "gc":
+        max_bytes = int(args.max_size_mb * 1024 * 1024) if args.max_size_mb is not None else None
+        result = store.gc(max_age_days=args.max_age_days, max_bytes=max_bytes)
+        print(f"🧹 Removed {result['entries']} entries and {result['objects']} objects ({result['bytes'] / 1024 / 1024:.1f} MB).")
+    else:
+        for kind, info in sorted(store.stats().items()):
+            print(f"  {kind:<14} {info['entries']:>7} entries  {info['bytes'] / 1024 / 1024:8.1f} MB")
@@ -0,0 +1,97 @@
+"""
+In-flight card records.
+
+Each card of a deck is one slotted record from preparation to packaging: every stage
+(TTS, image, explanation, IPA) fills its own fields on the same object, instead of a
+per-card dict of loose values. Media fields hold references to the buffers the
+stages produced (bytes, or memoryview slices of a batched TTS session), never copies.
+"""
+import re
+from dataclasses import dataclass
+
+import anki_creator
+
+Media = bytes | memoryview | None
+
+@dataclass(slots=True)
+class CardRecord:
+    front: str = ""
+    back: str = ""
+    translation_text: str = ""
+    text_for_ipa: str = ""
+    audio_text: str = ""      # sentence synthesized on its own (with word timings)
+    clip_word: str = ""       # word cut out of that sentence audio
+    audio: Media = None
+    word_audio: Media = None
+    slow_audio: Media = None
+    image: Media = None
+    ipa: str = ""
+    explanation_html: str = ""
+
+    def extra_fields(self) -> dict:
+        """
+        Mode-specific keyword arguments of create_flashcard.
+        """
+        return {}
+
+    def to_flashcard(self, mode: str) -> dict:
+        return anki_creator.create_flashcard(
+            self.audio,
+            self.image,
+            self.front,
+            self.back,
+            ipa_text=self.ipa,
+            translation_text=self.translation_text,
+            explanation_text=self.explanation_html,
+            mode=mode,
+            word_audio_bytes=self.word_audio,
+            slow_audio_bytes=self.slow_audio,
+            **self.extra_fields()
+        )
+
+@dataclass(slots=True)
+class DeclensionCard(CardRecord):
+    root_word: str = ""
+    case_info: str = ""
+
+    def extra_fields(self) -> dict:
+        return {"root_word": self.root_word, "case_info": self.case_info}
+
+def from_vocab(card: dict, mode: str) -> CardRecord:
+    """
+    The record of one vocab item (generate_vocab shape), with the fields that don't
+    need any external call and the texts to send to the stages (audio, IPA...).
+    """
+    if mode == "custom":
+        # Custom mode: Direct mapping, minimal interference
+        return CardRecord(front=card['source'], back=card['target'])
+
+    if mode == "declension":
+        # Keys: sentence_fr, sentence_pl_masked, root_word, declined_word, case_name_source, case_name_target
+        declined_word = card['declined_word']
+        return DeclensionCard(
+            # Format the sentence for Cloze: "Nie widzę ___." -> "Nie widzę {{c1::kota}}."
+            back=card['sentence_pl_masked'].replace("___", f"{{{{c1::{declined_word}}}}}"),
+            translation_text=card['sentence_fr'],
+            audio_text=card['sentence_pl_masked'].replace("___", declined_word),
+            clip_word=declined_word,
+            root_word=card['root_word'],
+            # Case Info: "Genitif (Dopełniacz)"
+            case_info=f"{card['case_name_source']} ({card['case_name_target']})"
+        )
+
+    if mode == "cloze":
+        # Source = word to guess (displayed in Extra), Target = sentence with <word>
+        # Audio for the full sentence (removed < > for natural reading);
+        # the <word> clip is cut out of the same audio, no extra TTS request.
+        hidden_word = re.search(r'<(.*?)>', card['target'])
+        return CardRecord(
+            front=card['source'],
+            back=card['target'],
+            translation_text=card.get('translation', ''),
+            audio_text=card['target'].replace("<", "").replace(">", ""),
+            clip_word=hidden_word.group(1) if hidden_word else ""
+        )
+
+    # Translation / Listening : Front = Source, Back = Target
+    return CardRecord(front=card['source'], back=card['target'], text_for_ipa=card['target'])
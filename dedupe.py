@@ -0,0 +1,150 @@
+"""
+Local near-duplicate detection for generated vocabulary ("Le chien" / "Un chien").
+
+Each text is normalized and cut into character n-grams (per word). A MinHash
+signature of the n-grams goes into an LSH index (banded buckets), so checking a new
+item only compares it with the few items sharing a bucket, not with the whole list:
+it stays fast with tens of thousands of items. Candidates are then confirmed with
+the exact Jaccard similarity of their n-grams.
+"""
+import hashlib
+import re
+import struct
+import unicodedata
+
+# Each n-gram is hashed with blake2b: one 64-byte digest gives 16 of the hash values
+_HASHES_PER_DIGEST = 16
+_UNPACK_DIGEST = struct.Struct("<16I").unpack
+
+def normalize(text: str) -> str:
+    """
+    Lowercase, without accents, punctuation, cloze brackets or extra spaces.
+    """
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+def shingles(text: str, n: int = 3) -> set:
+    """
+    Character n-grams of each word, padded so short words still count ("le" -> " le", "le ").
+    """
+    grams = set()
+    for word in normalize(text).split():
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams.add(padded)
+        grams.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+# Probability that a pair exactly at the similarity threshold becomes a candidate
+MIN_CANDIDATE_RECALL = 0.95
+
+def _bands_for(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    (bands, rows) with bands * rows <= num_perm: the most rows (fewest false candidates)
+    for which a pair with similarity == threshold still shares a bucket with probability
+    1 - (1 - threshold^rows)^bands >= MIN_CANDIDATE_RECALL. The LSH threshold thus sits
+    well below `threshold`; the exact Jaccard check removes the extra candidates.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= MIN_CANDIDATE_RECALL:
+            best = (bands, rows)
+    return best
+
+class NearDuplicateIndex:
+    """
+    Items are tuples of texts (e.g. source and target); two items are near-duplicates
+    when any of their texts at the same position have a similarity >= threshold.
+    """
+
+    def __init__(self, threshold: float = 0.6, num_perm: int = 96, ngram: int = 3):
+        if num_perm % _HASHES_PER_DIGEST:
+            raise ValueError(f"num_perm must be a multiple of {_HASHES_PER_DIGEST}.")
+        self.threshold = threshold
+        self.ngram = ngram
+        self.bands, self.rows = _bands_for(threshold, num_perm)
+        self._salts = [i.to_bytes(16, "little") for i in range(num_perm // _HASHES_PER_DIGEST)]
+        self._buckets = {}  # (field, band, band signature) -> [item ids]
+        self._items = []    # shingle sets per field, by item id
+
+    def _signature(self, grams: set) -> list:
+        signature = []
+        for salt in self._salts:
+            rows = [_UNPACK_DIGEST(hashlib.blake2b(gram.encode("utf-8"), digest_size=64, salt=salt).digest())
+                    for gram in grams]
+            signature.extend(map(min, zip(*rows)))
+        return signature
+
+    def _band_keys(self, field: int, grams: set) -> list:
+        if not grams:
+            return []
+        signature = self._signature(grams)
+        return [(field, band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                for band in range(self.bands)]
+
+    def find(self, *texts) -> int | None:
+        """
+        Id of an indexed item that is a near-duplicate of `texts`, or None.
+        """
+        fields = [shingles(text, self.ngram) for text in texts]
+        return self._find(fields, [self._band_keys(field, grams) for field, grams in enumerate(fields)])
+
+    def _find(self, fields: list, keys: list) -> int | None:
+        for field, grams in enumerate(fields):
+            candidates = set()
+            for key in keys[field]:
+                candidates.update(self._buckets.get(key, ()))
+            for item_id in sorted(candidates):
+                if jaccard(grams, self._items[item_id][field]) >= self.threshold:
+                    return item_id
+        return None
+
+    def add(self, *texts) -> bool:
+        """
+        Indexes the item unless it is a near-duplicate of one already indexed.
+        Returns True if it was added.
+        """
+        fields = [shingles(text, self.ngram) for text in texts]
+        keys = [self._band_keys(field, grams) for field, grams in enumerate(fields)]
+        if self._find(fields, keys) is not None:
+            return False
+        item_id = len(self._items)
+        self._items.append(fields)
+        for field_keys in keys:
+            for key in field_keys:
+                self._buckets.setdefault(key, []).append(item_id)
+        return True
+
+    def __len__(self):
+        return len(self._items)
+
+def item_texts(card: dict, mode: str, target_langs: tuple = ()) -> tuple:
+    """
+    Texts compared for one vocab item (generate_vocab shape, or generate_vocab_multi
+    shape with the target languages in `target_langs` order).
+    """
+    if mode == "declension":
+        return (card.get("sentence_fr", ""), card.get("sentence_pl_masked", ""))
+    if "targets" in card:
+        targets = card.get("targets") or {}
+        return (card.get("source", ""),) + tuple(targets.get(lang, "") for lang in target_langs)
+    return (card.get("source", ""), card.get("target", ""))
+
+def filter_items(items: list, index: NearDuplicateIndex, mode: str, target_langs: tuple = (), limit: int = None) -> tuple[list, list]:
+    """
+    Checks items in order against the index (adding the new ones), until `limit`
+    items are kept. Returns (kept, dropped).
+    """
+    kept, dropped = [], []
+    for card in items:
+        if limit is not None and len(kept) >= limit:
+            break
+        (kept if index.add(*item_texts(card, mode, target_langs)) else dropped).append(card)
+    return kept, dropped
@@ -0,0 +1,55 @@
+"""
+Machine-readable progress events (--events jsonl).
+
+Every step of a run can emit an event: a dict with "event", "ts" (unix time) and its
+own fields. With --events jsonl they are written to stdout, one JSON object per line
+(the human-readable output then goes to stderr), for orchestrators and dashboards.
+In-process consumers (the Streamlit progress bar) subscribe a callback instead.
+Subscriptions are scoped to the current context (thread / asyncio task and the
+tasks it starts), so concurrent sessions or jobs only see their own events.
+
+Events: job_start, backend_ready, vocab_received, stage_start, stage_end, card_done,
+retry, cache_hit, stage_utilization, package_written, notes_sent, job_end, job_error.
+"""
+import contextvars
+import json
+import sys
+import threading
+import time
+
+_stream = None
+_subscribers = contextvars.ContextVar("event_subscribers", default=())
+_lock = threading.Lock()
+
+def enable_jsonl(stream=None):
+    """
+    Writes the events as JSON lines to `stream` (default: the current stdout).
+    """
+    global _stream
+    _stream = stream or sys.stdout
+
+def subscribe(callback):
+    """
+    callback(event: dict) is called for every event emitted in the current context
+    (this thread or task, and the tasks started from it afterwards).
+    """
+    _subscribers.set(_subscribers.get() + (callback,))
+
+def unsubscribe(callback):
+    _subscribers.set(tuple(subscriber for subscriber in _subscribers.get() if subscriber is not callback))
+
+def is_enabled() -> bool:
+    return _stream is not None or bool(_subscribers.get())
+
+def emit(event: str, **fields):
+    subscribers = _subscribers.get()
+    if _stream is None and not subscribers:
+        return
+    record = {"event": event, "ts": round(time.time(), 3), **fields}
+    if _stream is not None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _lock:
+            _stream.write(line + "\n")
+            _stream.flush()
+    for callback in subscribers:
+        callback(record)
@@ -0,0 +1,85 @@
+"""
+Post-processing of the explanation HTML returned by Gemini.
+
+The prompt asks for inline styles (<span style='color: #e74c3c;'>, a styled recap <div>...)
+that are repeated on every card. They are rewritten into the CSS classes below (added
+to the card CSS once per note type), redundant markup is dropped and the HTML is minified.
+Only the exact style strings of the prompt are mapped; any other inline style is kept.
+
+Example:
+  <div style='background-color: #f8f9fa; padding: 10px; border-radius: 5px; margin-top: 10px; border-left: 4px solid #3498db;'>
+  -> <div class="g-recap">
+"""
+import re
+
+# Inline declarations -> class. Keys are normalized declarations (see _normalize_style).
+STYLE_CLASSES = {
+    "color:#e74c3c": "g-verb",
+    "color:#3498db": "g-noun",
+    "color:#27ae60": "g-rule",
+    "font-size:15px": "g-body",
+    # Recap boxes: the prompt's example, and the box of its sample explanation
+    "background-color:#f0f0f0;border-radius:4px;margin-top:10px;padding:8px": "g-box",
+    "background-color:#f8f9fa;border-left:4px solid #3498db;border-radius:5px;margin-top:10px;padding:10px": "g-recap",
+}
+
+COMPACT_CSS = """
+.g-body { font-size: 15px; }
+.g-verb { color: #e74c3c; }
+.g-noun { color: #3498db; }
+.g-rule { color: #27ae60; }
+.g-box { background-color: #f0f0f0; padding: 8px; border-radius: 4px; margin-top: 10px; }
+.g-recap { background-color: #f8f9fa; padding: 10px; border-radius: 5px; margin-top: 10px; border-left: 4px solid #3498db; }
+"""
+
+_STYLE_ATTR = re.compile(r"""\sstyle\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+_CLASS_ATTR = re.compile(r"""\sclass\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE)
+_START_TAG = re.compile(r"<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*?)?(/?)>")
+_EMPTY_ELEMENT = re.compile(r"<(p|div|ul|li)(?:\s[^<>]*)?>\s*</\1>|<(span|b|i)(?:\s[^<>]*)?></\2>", re.IGNORECASE)
+_BLOCK_TAG = re.compile(r"\s*(</?(?:div|p|ul|ol|li|br|hr)\b[^<>]*>)\s*", re.IGNORECASE)
+_CODE_FENCE = re.compile(r"^\s*```(?:html)?\s*|\s*```\s*$", re.IGNORECASE)
+
+def _normalize_style(style: str) -> str:
+    declarations = [re.sub(r"\s*:\s*", ":", " ".join(d.lower().split())) for d in style.split(";") if d.strip()]
+    return ";".join(sorted(declarations))
+
+def _style_to_class(style: str) -> str | None:
+    return STYLE_CLASSES.get(_normalize_style(style))
+
+def _rewrite_tag(match: re.Match) -> str:
+    tag, attrs, self_closing = match.group(1), match.group(2) or "", match.group(3)
+    style = _STYLE_ATTR.search(attrs)
+    if style:
+        css_class = _style_to_class(style.group(1) if style.group(1) is not None else style.group(2))
+        if css_class:
+            attrs = attrs[:style.start()] + attrs[style.end():]
+            existing = _CLASS_ATTR.search(attrs)
+            if existing:
+                classes = (existing.group(1) if existing.group(1) is not None else existing.group(2)).split()
+                attrs = attrs[:existing.start()] + attrs[existing.end():]
+                css_class = " ".join(classes + [css_class])
+            attrs = f' class="{css_class}"' + attrs
+    return f"<{tag}{attrs.rstrip()}{self_closing}>"
+
+def compact(html: str) -> str:
+    """
+    Rewrites known inline styles into classes, removes empty elements, comments and
+    markdown fences, and collapses whitespace.
+    """
+    if not html:
+        return html
+
+    result = _CODE_FENCE.sub("", html)
+    result = re.sub(r"<!--.*?-->", "", result, flags=re.DOTALL)
+    result = _START_TAG.sub(_rewrite_tag, result)
+
+    # Empty elements may be nested: repeat until stable
+    previous = None
+    while previous != result:
+        previous = result
+        result = _EMPTY_ELEMENT.sub("", result)
+
+    # Whitespace around block tags is not rendered; inside text it is kept as one space
+    result = re.sub(r"\s+", " ", result)
+    result = _BLOCK_TAG.sub(r"\1", result)
+    return result.strip()
@@ -1,50 +1,219 @@
+import asyncio
+import re
 import requests
+from urllib.parse import urlparse
 from duckduckgo_search import DDGS
+from duckduckgo_search.exceptions import RatelimitException, TimeoutException
 
-def get(query: str) -> bytes | None:
+import artifact_store
+import dedupe
+import recorder
+import resilience
+
+# Image results scored per search (one results page: no extra request). Only the best
+# one is downloaded; the next ones are its hedge and its fallbacks.
+CANDIDATES = 10
+FALLBACK_DOWNLOADS = 2
+
+# Larger downloads are abandoned (the next candidate is tried)
+MAX_IMAGE_BYTES = 2 * 1024 * 1024
+
+# Stock photo sites: watermarked previews
+WATERMARKED_DOMAINS = ("shutterstock", "alamy", "dreamstime", "istockphoto", "gettyimages", "depositphotos", "123rf", "vectorstock", "stock.adobe")
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+def _is_transient(e: Exception) -> bool:
+    return isinstance(e, (RatelimitException, TimeoutException, requests.ConnectionError, requests.Timeout))
+
+@recorder.recordable("image_search", is_transient=_is_transient)
+def _search(query: str) -> list:
+    """
+    Returns the first DuckDuckGo image results (possibly empty): dicts with the image
+    URL, its page URL, title, width and height.
+    """
+    with DDGS(timeout=resilience.POLICIES["image_search"].deadline) as ddgs:
+        results = list(ddgs.images(
+            query=query,
+            max_results=CANDIDATES,
+            safesearch="on"
+        ))
+    return [{key: result.get(key) for key in ("image", "url", "title", "width", "height")} for result in results]
+
+def score(candidate: dict, query: str) -> float:
+    """
+    Local relevance score of an image result, from its metadata only: query words in
+    the title / page URL, usable dimensions, a card-friendly aspect ratio, no stock
+    watermark, a raster format, and no huge file.
+    """
+    points = 0.0
+    words = set(dedupe.normalize(query).split())
+    if words:
+        title = set(dedupe.normalize(candidate.get("title") or "").split())
+        page = dedupe.normalize(urlparse(candidate.get("url") or "").path)
+        points += 3 * len(words & title) / len(words)
+        points += 1 * sum(word in page for word in words) / len(words)
+
+    try:
+        width, height = int(candidate.get("width") or 0), int(candidate.get("height") or 0)
+    except (TypeError, ValueError):
+        width = height = 0
+    if width and height:
+        if min(width, height) < 150:
+            points -= 2
+        elif 300 <= max(width, height) <= 1600:
+            points += 1
+        # Pixels stand in for the byte size (unknown before downloading)
+        if width * height > 4_000_000:
+            points -= 1.5
+        ratio = width / height
+        if ratio > 2.5 or ratio < 0.4:
+            points -= 1.5
+        elif 0.75 <= ratio <= 1.5:
+            points += 0.5
+
+    image_url = candidate.get("image") or ""
+    host = urlparse(image_url).netloc + urlparse(candidate.get("url") or "").netloc
+    if any(domain in host for domain in WATERMARKED_DOMAINS):
+        points -= 2
+    if re.search(r"\.(svg|gif)(\?|$)", image_url.lower()):
+        points -= 1
+    return points
+
+def rank(candidates: list, query: str) -> list:
+    """
+    Image URLs of the candidates, best score first (stable for equal scores).
+    """
+    # Recordings made before the scoring hold plain URLs
+    candidates = [{"image": c} if isinstance(c, str) else c for c in candidates]
+    ordered = sorted(candidates, key=lambda candidate: -score(candidate, query))
+    return [candidate["image"] for candidate in ordered if candidate.get("image")]
+
+async def _ranked_urls(query: str, refresh: bool = False) -> tuple[list, bool]:
+    """
+    Candidate URLs for a query, best first, and whether they come from the store. The
+    ranking is kept in the artifact store, so a later run goes straight to the download;
+    `refresh` searches again instead.
+    """
+    store = artifact_store.get_store()
+    if store and not refresh and (ranked := await store.get_json_async("image_ranking", [query])) is not None:
+        return ranked, True
+    candidates = await resilience.call("image_search", _search, query, is_transient=_is_transient)
+    ranked = rank(candidates, query)
+    if store and ranked:
+        await store.put_json_async("image_ranking", [query], ranked)
+    return ranked, False
+
+async def _download_first(image_urls: list) -> bytes | None:
+    """
+    Downloads the best candidate; the next ones (up to FALLBACK_DOWNLOADS) if it fails.
+    """
+    for position, image_url in enumerate(image_urls[:1 + FALLBACK_DOWNLOADS]):
+        # A slow host is hedged against the next candidate, not the same URL
+        hedge_url = image_urls[position + 1] if position + 1 < len(image_urls) else image_url
+        try:
+            image_data = await resilience.call(
+                "image_download", _download, image_url, hedge_args=(hedge_url,), is_transient=_is_transient
+            )
+        except resilience.CircuitOpenError:
+            raise
+        except Exception as e:
+            print(f"      ⚠️ Download failed ({e}), trying the next image.")
+            continue
+        if image_data:
+            return image_data
+    return None
+
+@recorder.recordable("image_download", is_transient=_is_transient)
+def _download(image_url: str) -> bytes | None:
+    with requests.get(image_url, headers=HEADERS, timeout=resilience.POLICIES["image_download"].deadline, stream=True) as response:
+        if response.status_code == 429 or response.status_code >= 500:
+            raise resilience.TransientError(f"HTTP {response.status_code}")
+        if response.status_code != 200:
+            print(f"      ⚠️ Download error (Code {response.status_code})")
+            return None
+
+        if int(response.headers.get("Content-Length") or 0) > MAX_IMAGE_BYTES:
+            print(f"      ⚠️ Image too large ({int(response.headers['Content-Length']) // 1024} KB), skipped.")
+            return None
+        content = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            content += chunk
+            if len(content) > MAX_IMAGE_BYTES:
+                print(f"      ⚠️ Image too large (over {MAX_IMAGE_BYTES // 1024} KB), skipped.")
+                return None
+        return bytes(content)
+
+def _probe_request(timeout: float):
+    response = requests.head("https://duckduckgo.com/", headers=HEADERS, timeout=timeout)
+    if response.status_code == 429 or response.status_code >= 500:
+        raise resilience.TransientError(f"HTTP {response.status_code}")
+
+async def probe(deadline: float = None):
+    """
+    Readiness probe (see warmup.py): DuckDuckGo answers, with the retries of the
+    "image_search" policy.
+    """
+    timeout = deadline or resilience.POLICIES["image_search"].deadline
+    await resilience.call("image_search", _probe_request, timeout, is_transient=_is_transient, deadline=deadline)
+
+async def get_async(query: str) -> bytes | None:
     """
     Search for an image on DuckDuckGo for the given word and return the bytes.
-    Returns None if no image is found or in case of an error.
+    Returns None if no image is found, in case of an error, or while the image
+    providers are considered down (the card is then created without image).
     """
     if not query:
         return None
 
+    store = artifact_store.get_store()
+    if store and (stored := await store.get_async("image", [query])) is not None:
+        return stored
+
     print(f"   🖼️  Searching for image for: '{query}'...")
 
     try:
-        with DDGS() as ddgs:
-            results = list(ddgs.images(
-                query=query,
-                max_results=1,
-                safesearch="on"
-            ))
-            
-            if not results:
-                print(f"      ⚠️ No image found for '{query}'.")
-                return None
-            
-            image_url = results[0]['image']
-            
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            
-            response = requests.get(image_url, headers=headers, timeout=5)
-            
-            if response.status_code == 200:
-                return response.content
-            else:
-                print(f"      ⚠️ Download error (Code {response.status_code})")
-                return None
+        image_urls, from_store = await _ranked_urls(query)
+        if not image_urls:
+            print(f"      ⚠️ No image found for '{query}'.")
+            return None
+
+        image_data = await _download_first(image_urls)
+        if image_data is None and from_store:
+            # A stored ranking may only list dead links by now: search again
+            tried = set(image_urls[:1 + FALLBACK_DOWNLOADS])
+            image_urls, _ = await _ranked_urls(query, refresh=True)
+            image_data = await _download_first([url for url in image_urls if url not in tried])
+        if store and image_data:
+            await store.put_async("image", [query], image_data)
+        elif store:
+            # Not kept: the next run searches again instead of retrying the same links
+            await store.delete_async("image_ranking", [query])
+        return image_data
 
+    except resilience.CircuitOpenError:
+        return None
     except Exception as e:
         print(f"      ❌ Image API Error : {e}")
         return None
 
+def get(query: str) -> bytes | None:
+    """
+    Blocking version of get_async, for scripts without an event loop only.
+    From async code (app.py, server.py, main.py), await get_async instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(get_async(query))
+    raise RuntimeError("image_api.get() can't be called from a running event loop: await get_async() instead.")
+
 if __name__ == "__main__":
     mot = "Pomme rouge"
     image_bytes = get(mot)
-    
+
     if image_bytes:
         print(f"✅ Image retrieved successfully ({len(image_bytes)} bytes)")
         with open("test_image.jpg", "wb") as f:
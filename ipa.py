@@ -1,10 +1,15 @@
+import asyncio
 import logging
 import shutil
 import os 
 import sys 
+from concurrent.futures import ProcessPoolExecutor
 from phonemizer import phonemize
+from phonemizer.backend import EspeakBackend
 from phonemizer.backend.espeak.wrapper import EspeakWrapper 
 
+import artifact_store
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -67,6 +72,211 @@ def get_ipa(text: str, lang_code: str) -> str:
         logger.error(f"❌ IPA Generation error for '{text}': {e}")
         return ""
 
+# --- Process-pool engine (large decks) ---
+
+# Per worker process: one warm espeak backend per language
+_worker_backends = {}
+
+def _get_worker_backend(backend_lang: str) -> EspeakBackend:
+    backend = _worker_backends.get(backend_lang)
+    if backend is None:
+        backend = EspeakBackend(
+            backend_lang,
+            preserve_punctuation=True,
+            with_stress=True
+        )
+        _worker_backends[backend_lang] = backend
+    return backend
+
+def _transcribe_chunk(texts: list, backend_lang: str) -> list:
+    """
+    Runs in a worker process. Phonemizes a chunk of texts with the worker's warm backend.
+    """
+    try:
+        backend = _get_worker_backend(backend_lang)
+        return backend.phonemize([t.replace("\n", " ") for t in texts], strip=True)
+    except Exception as e:
+        logger.error(f"❌ IPA Generation error for chunk of {len(texts)} texts: {e}")
+        return [""] * len(texts)
+
+def _warm_worker(backend_langs: list) -> bool:
+    """
+    Runs in a worker process: loads espeak and its backends for these languages.
+    """
+    for backend_lang in backend_langs:
+        _get_worker_backend(backend_lang).phonemize(["a"], strip=True)
+    return True
+
+def _init_worker(backend_langs: list):
+    """
+    Executor initializer: each worker process loads the backends before its first job.
+    Errors are left to the jobs (a failing initializer would break the whole pool).
+    """
+    try:
+        _warm_worker(backend_langs)
+    except Exception:
+        pass
+
+async def _as_async(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+class IPAEngine:
+    """
+    Runs espeak across all cores. Texts are sent to the workers in chunks,
+    and results always come back in input order.
+    """
+
+    def __init__(self, workers: int = None, chunk_size: int = 64):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor = None
+        self._pool_langs = set()    # backends loaded by the initializer of the current pool
+
+    def _get_executor(self, backend_langs: list = ()) -> ProcessPoolExecutor:
+        """
+        The worker pool, its initializer loading `backend_langs`. A language the current
+        pool wasn't started with gets a new pool (jobs already submitted finish on the old one).
+        """
+        if self._executor is None or not self._pool_langs.issuperset(backend_langs):
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._pool_langs.update(backend_langs)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(sorted(self._pool_langs),)
+            )
+        return self._executor
+
+    def _submit_chunks(self, texts: list, lang_code: str) -> list:
+        """
+        Submits the non-empty texts by chunks. Returns [(indexes, future)].
+        """
+        backend_lang = LANG_MAPPING.get(lang_code.lower())
+        if not backend_lang:
+            logger.warning(f"⚠️ Language '{lang_code}' not supported for IPA generation.")
+            return []
+
+        indexes = [i for i, text in enumerate(texts) if text]
+        jobs = []
+        for start in range(0, len(indexes), self.chunk_size):
+            chunk = indexes[start:start + self.chunk_size]
+            future = self._get_executor([backend_lang]).submit(_transcribe_chunk, [texts[i] for i in chunk], backend_lang)
+            jobs.append((chunk, future))
+        return jobs
+
+    async def warm_up(self, lang_codes: list):
+        """
+        Starts the worker processes with their backends loaded, before the first chunk.
+        Raises if espeak isn't installed or can't be loaded.
+        Every worker process loads the backends in its initializer (see _get_executor);
+        the warm jobs make the pool start its processes, but nothing guarantees each
+        process gets one of them.
+        """
+        if not is_backend_available():
+            raise RuntimeError("espeak not installed on your system")
+        backend_langs = [LANG_MAPPING[lang.lower()] for lang in lang_codes if lang.lower() in LANG_MAPPING]
+        if not backend_langs:
+            return
+        executor = self._get_executor(backend_langs)
+        futures = [executor.submit(_warm_worker, backend_langs) for _ in range(self.workers)]
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+
+    def transcribe(self, texts: list, lang_code: str) -> list:
+        """
+        Blocking batch transcription. Returns one IPA string per text ("" for empty texts or errors).
+        """
+        results = [""] * len(texts)
+        for chunk, future in self._submit_chunks(texts, lang_code):
+            for i, transcription in zip(chunk, future.result()):
+                results[i] = transcription
+        return results
+
+    async def transcribe_async(self, texts: list, lang_code: str) -> list:
+        """
+        Same as transcribe(), without blocking the event loop.
+        Reads through the artifact store when there is one.
+        """
+        store = artifact_store.get_store()
+        results = [""] * len(texts)
+        if store:
+            stored = await store.get_many_async("ipa", [[lang_code, text] for text in texts])
+            for i, data in enumerate(stored):
+                if texts[i] and data is not None:
+                    results[i] = data.decode("utf-8")
+        missing = [i for i, text in enumerate(texts) if text and not results[i]]
+
+        jobs = self._submit_chunks([texts[i] for i in missing], lang_code)
+        outputs = await asyncio.gather(*(asyncio.wrap_future(future) for _, future in jobs))
+        for (chunk, _), output in zip(jobs, outputs):
+            for i, transcription in zip(chunk, output):
+                results[missing[i]] = transcription
+        if store:
+            await store.put_many_async("ipa", [
+                ([lang_code, texts[i]], results[i].encode("utf-8")) for i in missing if results[i]
+            ])
+        return results
+
+    async def stream(self, texts, lang_code: str):
+        """
+        Streaming API: consumes a (sync or async) iterable of texts as it is produced,
+        keeps the workers busy with full chunks, and yields the IPA strings in input order,
+        each chunk as soon as it and the chunks before it are done.
+        """
+        pending = []
+        buffer = []
+
+        def flush():
+            if buffer:
+                pending.append(asyncio.ensure_future(self.transcribe_async(list(buffer), lang_code)))
+                buffer.clear()
+
+        try:
+            async for text in _as_async(texts):
+                buffer.append(text)
+                if len(buffer) >= self.chunk_size:
+                    flush()
+                    # Lets the chunk go out before reading on
+                    await asyncio.sleep(0)
+                # Hand back results that are already done, without waiting
+                while pending and pending[0].done():
+                    for transcription in pending.pop(0).result():
+                        yield transcription
+            flush()
+
+            while pending:
+                for transcription in await pending[0]:
+                    yield transcription
+                pending.pop(0)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_engine = None
+
+def get_engine() -> IPAEngine:
+    """
+    Shared engine for the whole process, so workers (and their backends) stay warm.
+    """
+    global _engine
+    if _engine is None:
+        _engine = IPAEngine()
+    return _engine
+
 if __name__ == "__main__":
     print(get_ipa("Hello, how are you today?", "en"))
     print(get_ipa("Bonjour, je voudrais une baguette.", "fr"))
\ No newline at end of file
@@ -2,19 +2,301 @@ import os
 import json
 import pprint
 import asyncio
-import random
+import contextvars
+import httpx
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 from dotenv import load_dotenv
 
+import artifact_store
+import events
+import recorder
+import resilience
+
 load_dotenv()
 
 
+# One warm client per API key, reused across calls (and jobs, in server.py)
+_clients = {}
+
 def get_client():
     api_key = os.environ.get("GOOGLE_API_KEY")
     if not api_key:
         raise ValueError("Missing GOOGLE_API_KEY environment variable. Please set it in .env or your application secrets.")
-    return genai.Client(api_key=api_key)
+    if api_key not in _clients:
+        _clients[api_key] = genai.Client(api_key=api_key)
+    return _clients[api_key]
+
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# --- Context caching of the static system prompts ---
+# A prompt is registered as cached content the second time it is used in a run
+# (single-use prompts aren't worth the cache storage). Prompts below the API's minimum
+# size for cached content, or that it refuses to cache, are sent inline, as before.
+PROMPT_CACHE_TTL = "3600s"
+MIN_CACHE_TOKENS = 1024     # minimum cached content size of GEMINI_MODEL
+
+_prompt_caches = {}     # system prompt -> cached content name, or None if not cacheable
+_prompt_cache_creations = {}    # system prompt -> task creating its cache (one per prompt)
+_prompt_uses = {}       # system prompt -> number of requests made with it (retries not counted)
+CACHE_STATS = {"cached_calls": 0, "inline_calls": 0, "tokens_saved": 0}
+
+async def _get_cached_prompt(client, system_instruction: str) -> str | None:
+    """
+    Returns the cached content name for a system prompt, creating it on second use
+    (uses are counted by _call_gemini, once per request). Concurrent callers share
+    the same creation request.
+    """
+    if system_instruction in _prompt_caches:
+        return _prompt_caches[system_instruction]
+    if estimate_tokens(system_instruction) < MIN_CACHE_TOKENS:
+        # Would be refused: no request
+        _prompt_caches[system_instruction] = None
+        return None
+    if _prompt_uses.get(system_instruction, 0) < 2:
+        return None
+
+    creation = _prompt_cache_creations.get(system_instruction)
+    if creation is None:
+        creation = asyncio.ensure_future(_create_prompt_cache(client, system_instruction))
+        _prompt_cache_creations[system_instruction] = creation
+    # Shielded: a cancelled caller doesn't cancel the creation the others wait for
+    return await asyncio.shield(creation)
+
+async def _create_prompt_cache(client, system_instruction: str) -> str | None:
+    try:
+        cache = await client.aio.caches.create(
+            model=GEMINI_MODEL,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                display_name="autoanki-system-prompt",
+                ttl=PROMPT_CACHE_TTL
+            )
+        )
+        _prompt_caches[system_instruction] = cache.name
+        print(f"🗄️ (Gemini) System prompt cached ({cache.name}).")
+    except Exception as e:
+        _prompt_caches[system_instruction] = None
+        print(f"ℹ️ Prompt caching unavailable, sending it inline ({e}).")
+    finally:
+        _prompt_cache_creations.pop(system_instruction, None)
+    return _prompt_caches[system_instruction]
+
+def _is_transient(e: Exception) -> bool:
+    """
+    Overload (5xx), rate limit (429) and network errors are retried; other API errors are not.
+    """
+    if isinstance(e, errors.APIError):
+        return e.code in (408, 429) or e.code >= 500
+    return isinstance(e, httpx.TransportError)
+
+@recorder.recordable(
+    "gemini",
+    key=lambda contents, system_instruction, **config: [contents, system_instruction, config],
+    dump=lambda response: response.model_dump(mode="json", exclude_none=True),
+    load=types.GenerateContentResponse.model_validate,
+    is_transient=_is_transient
+)
+async def _generate_content(contents: str, system_instruction: str, **config):
+    """
+    generate_content() referencing the cached system prompt when there is one.
+    Falls back to the inline prompt if the cache was rejected (expired, deleted...).
+    """
+    client = get_client()
+    cache_name = await _get_cached_prompt(client, system_instruction)
+    if cache_name:
+        try:
+            response = await client.aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=contents,
+                config=types.GenerateContentConfig(cached_content=cache_name, **config)
+            )
+            CACHE_STATS["cached_calls"] += 1
+            usage = response.usage_metadata
+            if usage and usage.cached_content_token_count:
+                CACHE_STATS["tokens_saved"] += usage.cached_content_token_count
+            events.emit("cache_hit", cache="prompt", tokens=usage.cached_content_token_count if usage else None)
+            return response
+        except errors.ClientError as e:
+            if e.code == 429:
+                raise
+            print(f"ℹ️ Cached prompt rejected ({e.code}), sending it inline.")
+            _prompt_caches[system_instruction] = None
+
+    CACHE_STATS["inline_calls"] += 1
+    return await client.aio.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=contents,
+        config=types.GenerateContentConfig(system_instruction=system_instruction, **config)
+    )
+
+async def probe(deadline: float = None):
+    """
+    Readiness probe (see warmup.py): creates the client and reads the model's metadata
+    (no tokens used), with the retries of the "gemini" policy.
+    """
+    await resilience.call(
+        "gemini", lambda: get_client().aio.models.get(model=GEMINI_MODEL),
+        is_transient=_is_transient, deadline=deadline
+    )
+
+# --- Token & cost accounting ---
+# USD per 1M tokens for GEMINI_MODEL (paid tier). Update if the pricing changes.
+PRICING = {"input": 0.30, "cached_input": 0.03, "output": 2.50}
+
+# Usage and budget are accounted per context: the CLI run uses the process account,
+# each server job opens its own (start_account), shared by the tasks it starts.
+def _new_account(budget: float = None) -> dict:
+    return {
+        "usage": {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0},
+        "budget": budget,           # USD, None = unlimited
+        "budget_reported": False,
+    }
+
+_process_account = _new_account()
+_account = contextvars.ContextVar("llm_account", default=_process_account)
+
+class BudgetExceeded(Exception):
+    """Raised instead of calling Gemini once the run's budget is spent."""
+
+def start_account(budget: float | None = None):
+    """
+    Gives the current context (and the tasks started from it) its own usage and budget.
+    """
+    _account.set(_new_account(budget))
+
+def set_budget(usd: float | None):
+    _account.get()["budget"] = usd
+
+def usage() -> dict:
+    """
+    Calls and tokens of the current account.
+    """
+    return _account.get()["usage"]
+
+def estimate_cost(prompt_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * PRICING["input"] + cached_tokens * PRICING["cached_input"]
+            + output_tokens * PRICING["output"]) / 1_000_000
+
+def spent() -> float:
+    totals = usage()
+    return estimate_cost(totals["prompt_tokens"], totals["cached_tokens"], totals["output_tokens"])
+
+def _record_usage(response):
+    metadata = response.usage_metadata
+    totals = usage()
+    totals["calls"] += 1
+    if not metadata:
+        return
+    totals["prompt_tokens"] += metadata.prompt_token_count or 0
+    totals["cached_tokens"] += metadata.cached_content_token_count or 0
+    # Thinking tokens are billed as output
+    totals["output_tokens"] += (metadata.candidates_token_count or 0) + (metadata.thoughts_token_count or 0)
+
+def print_usage_report():
+    totals, limit = usage(), _account.get()["budget"]
+    if not totals["calls"]:
+        return
+    budget = f" / budget ${limit:.4f}" if limit is not None else ""
+    print(f"💰 Gemini: {totals['calls']} calls, {totals['prompt_tokens']} input tokens "
+          f"({totals['cached_tokens']} cached), {totals['output_tokens']} output tokens "
+          f"≈ ${spent():.4f}{budget}")
+    if RULE_STATS["reused"]:
+        print(f"♻️ Declension rules: {RULE_STATS['generated']} explanations generated, "
+              f"{RULE_STATS['reused']} reused by other sentences.")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token).
+    """
+    return len(text) // 4 + 1
+
+# Expected output tokens per generated item, per explanation, and share of cards
+# long enough (>= 3 words) to get an explanation, by mode.
+# Declension: one explanation per rule signature, shared by several sentences.
+OUTPUT_TOKENS_PER_ITEM = {"translation": 15, "listening": 15, "cloze": 45, "custom": 30, "declension": 80}
+OUTPUT_TOKENS_PER_EXPLANATION = 400
+EXPLAINED_SHARE = {"translation": 0.2, "listening": 0.2, "cloze": 1.0, "custom": 0.5, "declension": 0.3}
+
+def estimate_llm_usage(mode: str, count: int, explain: bool, target_count: int = 1, generated: bool = True, completed: int = 0) -> dict:
+    """
+    Pre-run estimate of the Gemini calls and tokens for a deck (see --dry-run).
+    With an imported list (--input), `generated` is False and `completed` is the number
+    of rows whose empty columns are filled by complete_vocab.
+    """
+    calls, prompt_tokens, output_tokens = 0, 0, 0
+    if generated:
+        system_prompt = {"custom": CUSTOM_SYSTEM_PROMPT, "declension": DECLENSION_SYSTEM_PROMPT}.get(
+            mode, VOCAB_SYSTEM_PROMPT if target_count == 1 else MULTI_VOCAB_SYSTEM_PROMPT
+        )
+        calls += 1
+        prompt_tokens += estimate_tokens(system_prompt) + 150
+        output_tokens += count * OUTPUT_TOKENS_PER_ITEM.get(mode, 30) * target_count
+    if completed:
+        batches = -(-completed // COMPLETION_BATCH_SIZE)
+        calls += batches
+        # The rows are sent back with their filled columns
+        prompt_tokens += batches * (estimate_tokens(COMPLETION_SYSTEM_PROMPT) + 80)
+        prompt_tokens += completed * OUTPUT_TOKENS_PER_ITEM.get(mode, 30) * target_count
+        output_tokens += completed * OUTPUT_TOKENS_PER_ITEM.get(mode, 30) * target_count
+
+    # Declension cards are always explained
+    if explain or mode == "declension":
+        explanations = round(count * EXPLAINED_SHARE.get(mode, 1.0)) * target_count
+        calls += explanations
+        prompt_tokens += explanations * (estimate_tokens(EXPLANATION_SYSTEM_PROMPT) + 60)
+        output_tokens += explanations * OUTPUT_TOKENS_PER_EXPLANATION
+
+    return {
+        "calls": calls,
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "cost": estimate_cost(prompt_tokens, 0, output_tokens),
+    }
+
+async def _call_gemini(contents: str, system_instruction: str, **config):
+    """
+    generate_content() under the 'gemini' resilience policy (deadline, retries, circuit breaker).
+    Refuses new work once the budget is spent.
+    """
+    account = _account.get()
+    if account["budget"] is not None and spent() >= account["budget"]:
+        if not account["budget_reported"]:
+            print(f"💰 Budget of ${account['budget']:.4f} reached: no new LLM work is scheduled.")
+            account["budget_reported"] = True
+        raise BudgetExceeded(f"LLM budget of ${account['budget']:.4f} reached (spent ≈ ${spent():.4f})")
+
+    # Counted here, outside the retries: a retried one-off prompt is still used once
+    _prompt_uses[system_instruction] = _prompt_uses.get(system_instruction, 0) + 1
+    response = await resilience.call(
+        "gemini",
+        _generate_content,
+        contents,
+        system_instruction,
+        is_transient=_is_transient,
+        **config
+    )
+    _record_usage(response)
+    return response
+
+def release_prompt_caches():
+    """
+    Deletes the cached prompts of this run and prints how many input tokens were saved.
+    """
+    names = [name for name in _prompt_caches.values() if name]
+    if names:
+        client = get_client()
+        for name in names:
+            try:
+                client.caches.delete(name=name)
+            except Exception as e:
+                print(f"⚠️ Could not delete cached prompt {name}: {e}")
+        print(f"🗄️ Prompt cache: {CACHE_STATS['cached_calls']} calls served from cache, "
+              f"{CACHE_STATS['tokens_saved']} input tokens saved.")
+    _prompt_caches.clear()
+    _prompt_uses.clear()
 
 
 
@@ -51,6 +333,37 @@ Now, generate the JSON for the following request:
 
 """
 
+MULTI_VOCAB_SYSTEM_PROMPT = """
+
+You are an expert linguist and a strict data formatting assistant for an Anki flashcard generator.
+
+### GOAL
+Generate ONE list of high-quality vocabulary words or short phrases based on a specific TOPIC, and translate every item from the SOURCE language into EACH of the TARGET languages.
+
+### GUIDELINES
+1. **Format**: Output strictly a valid JSON array. NO Markdown code blocks (like ```json), NO conversational text. Just the raw JSON string.
+2. **Structure**: Each object must have the keys "source" and "targets". "targets" is an object with one key per TARGET language code.
+3. **Grammar**: ALWAYS include definite articles for nouns (e.g., "Le chien" instead of "chien", "Der Tisch" instead of "Tisch") to teach gender.
+4. **Consistency**: Every target must translate the same concept, chosen for the specific TOPIC.
+
+### ONE-SHOT EXAMPLE
+User Input:
+Topic: "Weather"
+Source: "en"
+Targets: "fr, de"
+Count: 2
+
+Your Output:
+[
+  {"source": "The sun", "targets": {"fr": "Le soleil", "de": "Die Sonne"}},
+  {"source": "The rain", "targets": {"fr": "La pluie", "de": "Der Regen"}}
+]
+
+### INSTRUCTION
+Now, generate the JSON for the following request:
+
+"""
+
 EXPLANATION_SYSTEM_PROMPT = """
 You are an expert linguist.
 
@@ -140,6 +453,7 @@ Each object must have these keys:
 - "declined_word": The target word correctly declined.
 - "case_name_source": The name of the grammatical case in French (e.g., Datif, Locatif).
 - "case_name_target": The name of the grammatical case in Polish (e.g., Celownik, Miejscownik).
+- "trigger_word": The word of the sentence that requires this case (preposition, verb, negation...), as written in the sentence.
 
 ### EXAMPLE
 User Input: "Create exercises for 'Kot' (Cat) in Genitive."
@@ -151,16 +465,27 @@ Output:
     "root_word": "Kot",
     "declined_word": "kota",
     "case_name_source": "Génitif",
-    "case_name_target": "Dopełniacz"
+    "case_name_target": "Dopełniacz",
+    "trigger_word": "Nie"
   }
 ]
 """
 
-async def generate_vocab(topic: str, source_lang: str, target_lang: str, count: int, mode: str = "translation") -> list:
+# Items listed in an "avoid" instruction (top-up requests after deduplication)
+MAX_EXCLUDED_ITEMS = 300
+
+def _exclusion_instruction(exclude: list | None) -> str:
+    if not exclude:
+        return ""
+    listed = "; ".join(exclude[-MAX_EXCLUDED_ITEMS:])
+    return f"\n    AVOID: Do NOT repeat or rephrase any of these items (already in the deck): {listed}"
+
+async def generate_vocab(topic: str, source_lang: str, target_lang: str, count: int, mode: str = "translation", exclude: list = None) -> list:
     """
     Generate vocabulary list.
     Args:
         mode: 'translation' (default), 'listening', 'cloze', 'custom', or 'declension'.
+        exclude: items already generated, that the new ones must not repeat.
     """
     
     mode_instruction = ""
@@ -196,7 +521,7 @@ async def generate_vocab(topic: str, source_lang: str, target_lang: str, count:
     Source: "{source_lang}"
     Target: "{target_lang}"
     Count: {count}
-    {mode_instruction}
+    {mode_instruction}{_exclusion_instruction(exclude)}
     
     Generate the JSON list now.
     """
@@ -204,15 +529,11 @@ async def generate_vocab(topic: str, source_lang: str, target_lang: str, count:
     print(f"⏳ (Gemini) Generation for : '{topic}' (Mode: {mode})...")
 
     try:
-        client = get_client()
-        response = client.models.generate_content(
-            model="gemini-2.5-flash", 
-            contents=user_prompt,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                temperature=0.4,
-                response_mime_type="application/json"
-            )
+        response = await _call_gemini(
+            user_prompt,
+            system_instruction,
+            temperature=0.4,
+            response_mime_type="application/json"
         )
 
         raw_content = response.text
@@ -228,6 +549,151 @@ async def generate_vocab(topic: str, source_lang: str, target_lang: str, count:
         print(f"❌ Gemini API Error : {e}")
         return []
 
+async def generate_vocab_multi(topic: str, source_lang: str, target_langs: list, count: int, mode: str = "translation", exclude: list = None) -> list:
+    """
+    Generate one concept list translated to several target languages in a single request.
+    Returns items like {"source": ..., "targets": {lang: ...}} (see split_multi_vocab).
+    Args:
+        mode: 'translation' (default), 'listening' or 'cloze'.
+        exclude: items already generated, that the new ones must not repeat.
+    """
+    mode_instruction = ""
+    if mode == "listening":
+        mode_instruction = "CONTEXT: This list is for an Oral Comprehension exercise. Choose words/phrases that are distinct and good for listening practice."
+    elif mode == "cloze":
+        mode_instruction = """CONTEXT: This list is for a CLOZE DELETION test.
+        For each item:
+        - "source": The word to guess (in Source Language).
+        - "translation": A full sentence in Source Language containing that word.
+        - "targets": For each Target Language, that sentence translated, where the word to guess is surrounded by angle brackets like <word>.
+        Example: {"source": "Banana", "translation": "Le singe mange une banane.", "targets": {"en": "The monkey eats a <banana>."}}
+        """
+
+    user_prompt = f"""
+    Topic: "{topic}"
+    Source: "{source_lang}"
+    Targets: "{', '.join(target_langs)}"
+    Count: {count}
+    {mode_instruction}{_exclusion_instruction(exclude)}
+    
+    Generate the JSON list now.
+    """
+
+    print(f"⏳ (Gemini) Generation for : '{topic}' (Mode: {mode}, Targets: {', '.join(target_langs)})...")
+
+    try:
+        response = await _call_gemini(
+            user_prompt,
+            MULTI_VOCAB_SYSTEM_PROMPT,
+            temperature=0.4,
+            response_mime_type="application/json"
+        )
+
+        vocab_list = json.loads(response.text)
+        
+        print(f"✅ Reçu {len(vocab_list)} cartes ({len(target_langs)} langues).")
+        return vocab_list
+
+    except json.JSONDecodeError:
+        print("❌ Error: The returned JSON is malformed.")
+        return []
+    except Exception as e:
+        print(f"❌ Gemini API Error : {e}")
+        return []
+
+def split_multi_vocab(multi_vocab: list, target_lang: str) -> list:
+    """
+    Extracts the single-language vocab list (same shape as generate_vocab) for one target.
+    Items missing that language are skipped.
+    """
+    vocab_list = []
+    for item in multi_vocab:
+        target = item.get("targets", {}).get(target_lang)
+        if not target:
+            continue
+        card = {"source": item.get("source", ""), "target": target}
+        if "translation" in item:
+            card["translation"] = item["translation"]
+        vocab_list.append(card)
+    return vocab_list
+
+COMPLETION_SYSTEM_PROMPT = """
+
+You are an expert linguist and a strict data formatting assistant for an Anki flashcard generator.
+
+### GOAL
+The user sends a JSON array of flashcard items imported from an existing word list. Some values are empty strings: fill them in, translating between the SOURCE and TARGET languages.
+
+### GUIDELINES
+1. **Format**: Output strictly a valid JSON array with the same number of items, in the same order. NO Markdown code blocks, NO conversational text.
+2. **Keep**: NEVER change a value that is not empty, and don't add or remove keys.
+3. **Grammar**: Include definite articles for nouns when the other side of the item has one.
+4. **Cloze**: A "target" sentence surrounds the word to guess with angle brackets like <word>.
+
+### ONE-SHOT EXAMPLE
+User Input:
+Source: "en"
+Targets: "fr"
+Items: [{"source": "The sun", "target": ""}, {"source": "", "target": "La pluie"}]
+
+Your Output:
+[
+  {"source": "The sun", "target": "Le soleil"},
+  {"source": "The rain", "target": "La pluie"}
+]
+
+"""
+
+# Imported rows per complete_vocab request
+COMPLETION_BATCH_SIZE = 50
+
+async def complete_vocab(items: list, source_lang: str, target_langs: list, mode: str = "translation") -> list:
+    """
+    Fills the empty values of imported vocab items (generate_vocab or generate_vocab_multi
+    shape) in one request. Values already present are kept as they are; on error, the
+    items are returned unchanged.
+    """
+    user_prompt = f"""
+    Source: "{source_lang}"
+    Targets: "{', '.join(target_langs)}"
+    Mode: {mode}
+    Items: {json.dumps(items, ensure_ascii=False)}
+
+    Return the completed JSON list now.
+    """
+
+    try:
+        response = await _call_gemini(
+            user_prompt,
+            COMPLETION_SYSTEM_PROMPT,
+            temperature=0.2,
+            response_mime_type="application/json"
+        )
+        completed = json.loads(response.text)
+    except json.JSONDecodeError:
+        print("❌ Error: The returned JSON is malformed.")
+        return items
+    except Exception as e:
+        print(f"❌ Gemini API Error : {e}")
+        return items
+
+    if not isinstance(completed, list) or len(completed) != len(items):
+        print(f"⚠️ Completion returned {len(completed) if isinstance(completed, list) else 0} items for {len(items)}, ignored.")
+        return items
+    return [_fill_empty(item, filled) for item, filled in zip(items, completed)]
+
+def _fill_empty(item, filled):
+    """
+    `item` with its empty values taken from `filled` (nested "targets" included).
+    """
+    if isinstance(item, dict):
+        if not isinstance(filled, dict):
+            return item
+        return {key: _fill_empty(value, filled.get(key)) for key, value in item.items()}
+    if item == "" and isinstance(filled, str):
+        return filled.strip()
+    return item
+
 # Quick test
 if __name__ == "__main__":
     import asyncio
@@ -265,34 +731,135 @@ async def generate_explanation(sentence: str, source_lang: str, target_lang: str
         Explain the grammar, structure, and nuances.
         """
     
+    store = artifact_store.get_store()
+    store_key = [GEMINI_MODEL, mode, source_lang, target_lang, sentence]
+    if store and (stored := await store.get_text_async("explanation", store_key)) is not None:
+        return stored
+
     print(f"🧠 (Gemini) Generating explanation for : '{sentence[:50]}...'...")
 
-    max_retries = 3
-    base_delay = 2
+    try:
+        response = await _call_gemini(
+            prompt,
+            EXPLANATION_SYSTEM_PROMPT,
+            temperature=0.7,
+            response_mime_type="text/plain"
+        )
+        if store and response.text:
+            await store.put_text_async("explanation", store_key, response.text)
+        return response.text
+    except (resilience.CircuitOpenError, BudgetExceeded):
+        # Gemini is down or the budget is spent: the card is created without explanation
+        return ""
+    except resilience.TransientError as e:
+        print(f"❌ Gemini API Error (Explanation) : {e}")
+        return "<p>Error: Could not generate explanation (Service Busy).</p>"
+    except Exception as e:
+        print(f"❌ Gemini API Error (Explanation) : {e}")
+        return "<p>Error generating explanation.</p>"
 
-    for attempt in range(max_retries):
-        try:
-            client = get_client()
-            response = client.models.generate_content(
-                model="gemini-2.5-flash", 
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=EXPLANATION_SYSTEM_PROMPT,
-                    temperature=0.7,
-                    response_mime_type="text/plain"
-                )
-            )
-            return response.text
-        except Exception as e:
-            error_str = str(e)
-            if "503" in error_str or "429" in error_str:
-                if attempt < max_retries - 1:
-                    wait_time = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                    print(f"⚠️ Service overloaded, retrying in {wait_time:.1f}s... (Attempt {attempt + 1}/{max_retries})")
-                    await asyncio.sleep(wait_time)
-                    continue
-            
-            print(f"❌ Gemini API Error (Explanation) : {e}")
-            return "<p>Error generating explanation.</p>"
-            
-    return "<p>Error: Could not generate explanation (Service Busy).</p>"
\ No newline at end of file
+# --- Declension: one explanation per grammar rule ---
+
+# (model, languages, rule signature) -> explanation of the rule, shared by the sentences
+# using it. Same key as the artifact store; the oldest entries are dropped past RULE_MEMO_SIZE.
+_rule_explanations = {}
+RULE_MEMO_SIZE = 2000
+RULE_STATS = {"generated": 0, "reused": 0}
+
+def trigger_word(card: dict) -> str:
+    """
+    The word requiring the case: given by Gemini, else the word before the blank.
+    """
+    if card.get("trigger_word"):
+        return card["trigger_word"]
+    before_blank = card.get("sentence_pl_masked", "").split("___")[0].split()
+    return before_blank[-1].strip(".,;:!?«»\"'") if before_blank else ""
+
+def rule_signature(card: dict) -> tuple:
+    return (
+        card.get("root_word", "").strip().lower(),
+        card.get("case_name_target", "").strip().lower(),
+        trigger_word(card).strip().lower(),
+    )
+
+async def _explain_rule(card: dict, source_lang: str, target_lang: str) -> str:
+    store = artifact_store.get_store()
+    store_key = [GEMINI_MODEL, source_lang, target_lang, list(rule_signature(card))]
+    if store and (stored := await store.get_text_async("declension_rule", store_key)) is not None:
+        return stored
+
+    trigger = trigger_word(card)
+    prompt = f"""
+        Source Language: "{source_lang}"
+        Target Language: "{target_lang}"
+        Word: "{card.get('root_word', '')}" declined as "{card.get('declined_word', '')}"
+        Case: {card.get('case_name_source', '')} ({card.get('case_name_target', '')})
+        Trigger: "{trigger or 'context'}"
+        
+        Explain strictly WHY "{trigger or 'this context'}" requires this case and how the word is declined in it.
+        Do not explain a specific sentence: the explanation is shared by every sentence using this rule.
+        Briefly mention the rule.
+        """
+    print(f"🧠 (Gemini) Generating rule explanation for : '{trigger} + {card.get('case_name_target', '')}' ({card.get('root_word', '')})...")
+    response = await _call_gemini(
+        prompt,
+        EXPLANATION_SYSTEM_PROMPT,
+        temperature=0.7,
+        response_mime_type="text/plain"
+    )
+    if store and response.text:
+        await store.put_text_async("declension_rule", store_key, response.text)
+    return response.text
+
+def _sentence_delta(card: dict) -> str:
+    """
+    The part of the explanation that is specific to the sentence (built locally).
+    """
+    trigger = trigger_word(card)
+    trigger_html = f"<b>{trigger}</b> + " if trigger else ""
+    return (f"<p>{trigger_html}<span style='color: #27ae60;'><b>{card.get('case_name_source', '')}</b></span> : "
+            f"<i>{card.get('root_word', '')}</i> → <span style='color: #3498db;'><b>{card.get('declined_word', '')}</b></span></p>")
+
+async def generate_declension_explanation(card: dict, source_lang: str, target_lang: str) -> str:
+    """
+    Explanation of a declension card. The rule part is generated once per rule signature
+    (root word, case, trigger word) and reused; only the short sentence-specific part
+    changes from card to card.
+    """
+    signature = rule_signature(card)
+    memo_key = (GEMINI_MODEL, source_lang, target_lang, signature)
+    rule_task = _rule_explanations.get(memo_key)
+    if rule_task is None:
+        RULE_STATS["generated"] += 1
+        rule_task = asyncio.ensure_future(_explain_rule(card, source_lang, target_lang))
+        _rule_explanations[memo_key] = rule_task
+        if len(_rule_explanations) > RULE_MEMO_SIZE:
+            del _rule_explanations[next(iter(_rule_explanations))]
+    else:
+        RULE_STATS["reused"] += 1
+        events.emit("cache_hit", cache="declension_rule", signature=list(signature))
+
+    try:
+        # Shielded: a cancelled card doesn't cancel the rule the other cards wait for
+        rule_html = await asyncio.shield(rule_task)
+    except asyncio.CancelledError:
+        if rule_task.cancelled() and _rule_explanations.get(memo_key) is rule_task:
+            # The shared task itself was cancelled (shutdown): the next card starts a new one
+            del _rule_explanations[memo_key]
+        if asyncio.current_task().cancelling() or not rule_task.cancelled():
+            raise
+        return ""
+    except (resilience.CircuitOpenError, BudgetExceeded):
+        if _rule_explanations.get(memo_key) is rule_task:
+            del _rule_explanations[memo_key]
+        return ""
+    except Exception as e:
+        # Not memoized: the next card with this rule tries again
+        if _rule_explanations.get(memo_key) is rule_task:
+            del _rule_explanations[memo_key]
+        print(f"❌ Gemini API Error (Explanation) : {e}")
+        if isinstance(e, resilience.TransientError):
+            return "<p>Error: Could not generate explanation (Service Busy).</p>"
+        return "<p>Error generating explanation.</p>"
+
+    return _sentence_delta(card) + rule_html
@@ -1,6 +1,8 @@
 import asyncio
 import argparse
+import os
 import sys
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +13,31 @@ import image_api
 import llm_call
 import tts_call
 import ipa
+import recorder
+import profiling
+import html_compact
+import ankiconnect
+import resilience
+import dedupe
+import events
+import artifact_store
+import scheduler
+import cards
+import vocab_import
+import warmup
+
+# Modes where one concept list can be translated to several target languages
+MULTI_TARGET_MODES = ("translation", "listening", "cloze")
+
+# Workers per pipeline stage (per target language), and cards admitted at once
+STAGE_WORKERS = {"llm": 2, "tts": 4, "image": 4, "ipa": 1, "package": 1}
+CARDS_IN_FLIGHT = 32
+
+# Top-up requests replacing the near-duplicates dropped by --dedupe
+DEDUPE_TOPUP_ROUNDS = 2
+
+# Average characters sent to TTS per card, by mode (for --dry-run)
+TTS_CHARS_PER_CARD = {"translation": 12, "listening": 12, "cloze": 60, "declension": 50, "custom": 0}
 
 def parse_arguments():
     """
@@ -25,15 +52,14 @@ def parse_arguments():
     parser.add_argument(
         "--topic", "-p",
         type=str,
-        required=True,
-        help="The topic or theme for the vocabulary list (e.g., 'Fruits', 'Business meetings')."
+        help="The topic or theme for the vocabulary list (e.g., 'Fruits', 'Business meetings'). Optional with --input."
     )
 
     parser.add_argument(
         "--target", "-t",
         type=str,
         required=True,
-        help="Target language code (e.g., 'pl', 'en', 'es')."
+        help="Target language code (e.g., 'pl', 'en', 'es'), or several comma-separated codes (e.g., 'pl,de,es') to build one deck per language."
     )
 
     # Optional arguments
@@ -47,8 +73,28 @@ def parse_arguments():
     parser.add_argument(
         "--count", "-c",
         type=int,
-        default=5,
-        help="Number of flashcards to generate."
+        help="Number of flashcards to generate (default: 5; with --input, every row of the file)."
+    )
+
+    parser.add_argument(
+        "--input", "-i",
+        type=str,
+        metavar="FILE",
+        help="Build the cards from an existing CSV / TSV / JSONL word list instead of generating one."
+    )
+
+    parser.add_argument(
+        "--fill",
+        action="store_true",
+        help="With --input: fill the empty columns with the LLM (in batches) instead of skipping those rows."
+    )
+
+    parser.add_argument(
+        "--header",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="With --input: the first CSV / TSV row is (or, with --no-header, is not) a header. "
+             "Default: a header only if all its names are known columns."
     )
 
     parser.add_argument(
@@ -65,7 +111,119 @@ def parse_arguments():
         help="Enable detailed grammar explanations (best for full sentences)."
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        "--output-dir", "-o",
+        type=str,
+        default=".",
+        help="Directory where the .apkg files are written."
+    )
+
+    replay_group = parser.add_mutually_exclusive_group()
+    replay_group.add_argument(
+        "--record",
+        type=str,
+        metavar="DIR",
+        help="Record every external call (Gemini, TTS, images) with its timing into DIR."
+    )
+
+    replay_group.add_argument(
+        "--replay",
+        type=str,
+        metavar="DIR",
+        help="Serve the external calls from a recording in DIR instead of the network."
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only print an estimate of the LLM calls, tokens, cost, TTS characters and image fetches, then exit."
+    )
+
+    parser.add_argument(
+        "--budget",
+        type=float,
+        metavar="USD",
+        help="Stop scheduling new LLM work once this cost is reached (what is done still gets packaged)."
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the run (CPU, per-card stage timeline, packaging allocations) and write a report next to the .apkg."
+    )
+
+    parser.add_argument(
+        "--max-cards",
+        type=int,
+        metavar="N",
+        help="Split the deck into packages of at most N cards (subdecks 'Deck::Part 01', ...), written in parallel."
+    )
+
+    parser.add_argument(
+        "--max-media-mb",
+        type=float,
+        metavar="MB",
+        help="Split the deck into packages of at most MB megabytes of media, written in parallel."
+    )
+
+    parser.add_argument(
+        "--store",
+        type=str,
+        metavar="DIR",
+        default=os.environ.get("AUTOANKI_STORE"),
+        help="Shared artifact store (audio, images, IPA, explanations) reused across runs and workers (default: $AUTOANKI_STORE)."
+    )
+
+    parser.add_argument(
+        "--dedupe",
+        nargs="?",
+        type=float,
+        const=0.5,
+        metavar="THRESHOLD",
+        help="Drop near-duplicate items (character n-gram similarity >= THRESHOLD, default 0.5) before enrichment and request replacements."
+    )
+
+    parser.add_argument(
+        "--hedge",
+        nargs="?",
+        type=float,
+        const=0.05,
+        metavar="MAX_RATE",
+        help="Duplicate TTS / image downloads still running after their p95 latency, for at most MAX_RATE of the calls (default: 0.05)."
+    )
+
+    parser.add_argument(
+        "--events",
+        choices=["jsonl"],
+        help="Emit machine-readable progress events on stdout (one JSON object per line); the usual output goes to stderr."
+    )
+
+    parser.add_argument(
+        "--ankiconnect",
+        nargs="?",
+        const=ankiconnect.DEFAULT_URL,
+        metavar="URL",
+        help=f"Send the cards to a running Anki through AnkiConnect instead of writing an .apkg (default URL: {ankiconnect.DEFAULT_URL})."
+    )
+
+    parser.add_argument(
+        "--replay-latency",
+        type=str,
+        choices=["recorded", "zero"],
+        default="recorded",
+        help="With --replay: reproduce the recorded response times, or answer instantly."
+    )
+
+    args = parser.parse_args()
+    if not args.topic:
+        if not args.input:
+            parser.error("--topic is required (unless --input is given).")
+        # Deck and file names come from the imported file
+        args.topic = os.path.splitext(os.path.basename(args.input))[0]
+    if args.count is None and not args.input:
+        args.count = 5
+    args.targets = [lang.strip() for lang in args.target.split(",") if lang.strip()]
+    return args
 
 def print_usage():
     """
@@ -81,10 +239,26 @@ Usage:
 Required Arguments:
   -p, --topic    The subject or theme of the vocabulary list (e.g., "Fruits").
   -t, --target   The target language code (e.g., "pl", "en", "es").
+                 Several codes ("pl,de,es") build one deck per language in one run.
 
 Optional Arguments:
   -s, --source   The source language code (default: "fr").
   -c, --count    Number of flashcards to generate (default: 5).
+  -i, --input FILE  Import a CSV / TSV / JSONL word list instead of generating one (--topic optional).
+  --fill         With --input: fill empty columns with the LLM instead of skipping those rows.
+  --header, --no-header  With --input: whether the first CSV / TSV row is a header (default: detected).
+  -o, --output-dir  Directory where the .apkg files are written (default: ".").
+  --record DIR   Record all external calls (LLM, TTS, images) into DIR.
+  --replay DIR   Replay a recording offline (--replay-latency recorded|zero).
+  --profile      Write a CPU / stage timeline / allocation report next to the .apkg.
+  --dry-run      Estimate LLM calls, tokens, cost, TTS characters and images, then exit.
+  --budget USD   Stop new LLM work once the estimated cost reaches USD.
+  --max-cards N, --max-media-mb MB  Split the deck into several .apkg parts (written in parallel).
+  --store DIR    Reuse audio, images, IPA and explanations from a shared store (also $AUTOANKI_STORE).
+  --dedupe [THRESHOLD]  Drop and replace near-duplicate items (similarity 0-1, default 0.5).
+  --hedge [MAX_RATE]   Duplicate slow TTS / image requests (at most 5% of them by default).
+  --events jsonl JSON-lines progress events on stdout (human output on stderr).
+  --ankiconnect [URL]  Send the cards straight to Anki (AnkiConnect add-on) instead of an .apkg.
   -m, --mode     Generation mode:
                  • 'translation' (Standard: Source -> Target + Audio + Image)
                  • 'listening'   (Audio Focus: Audio -> Target + Source)
@@ -100,6 +274,308 @@ Examples:
     """
     print(usage_text)
     
+def print_estimate(args):
+    """
+    Prints the expected external work for this run, without running anything.
+    """
+    rows = None
+    if args.input:
+        rows = vocab_import.scan(args.input, args.mode, args.targets, limit=args.count, header=args.header)
+        args.count = rows["rows"] if args.fill else rows["complete"]
+        llm = llm_call.estimate_llm_usage(args.mode, args.count, args.explain, len(args.targets),
+                                          generated=False, completed=rows["gaps"] if args.fill else 0)
+    else:
+        llm = llm_call.estimate_llm_usage(args.mode, args.count, args.explain, len(args.targets))
+    tts_chars = args.count * TTS_CHARS_PER_CARD.get(args.mode, 0) * len(args.targets)
+    images = args.count if args.mode == "translation" else 0
+
+    print("📋 Dry run estimate:")
+    if rows:
+        print(f"   Imported rows:    {rows['rows']} ({rows['gaps']} with empty columns)")
+    print(f"   LLM calls:        {llm['calls']}")
+    print(f"   LLM tokens:       ~{llm['prompt_tokens']} input, ~{llm['output_tokens']} output")
+    print(f"   LLM cost:         ~${llm['cost']:.4f}")
+    print(f"   TTS characters:   ~{tts_chars}")
+    print(f"   Image fetches:    {images}")
+    if args.budget is not None and llm['cost'] > args.budget:
+        print(f"   ⚠️ Above the budget (${args.budget:.4f}): some explanations will be skipped.")
+
+def fetch_image(images: dict, query: str) -> asyncio.Task:
+    """
+    Fetches each distinct image once, so decks for several
+    target languages share the same source-side images.
+    """
+    if query not in images:
+        images[query] = asyncio.ensure_future(image_api.get_async(query))
+    return images[query]
+
+async def build_deck(vocab_list: list, args, target_lang: str, images: dict, deck_name: str, progress=None, disabled: set = frozenset()) -> str | list:
+    """
+    Runs the per-card pipeline (audio, image, explanation, IPA) for one target language
+    and writes its .apkg (or sends it through AnkiConnect). Returns the output filename
+    (the list of part files with --max-cards / --max-media-mb, or the AnkiConnect URL).
+    Cards go through a stage scheduler: each stage has its own workers (STAGE_WORKERS);
+    the `disabled` stages (backend not ready) are left out.
+    """
+    log_prefix = f"{target_lang} " if len(args.targets) > 1 else ""
+    total = len(vocab_list)
+
+    # IPA streams out of the process pool chunk by chunk, while the other stages run:
+    # a card's transcription is ready as soon as its chunk is
+    with_ipa = args.mode in ("translation", "listening") and "ipa" not in disabled
+    ipa_results = [asyncio.get_running_loop().create_future() for _ in vocab_list] if with_ipa else []
+
+    async def stream_ipa():
+        try:
+            index = 0
+            async for transcription in ipa.get_engine().stream((card.get('target', '') for card in vocab_list), target_lang):
+                ipa_results[index].set_result(transcription)
+                index += 1
+        except Exception as e:
+            for future in ipa_results:
+                if not future.done():
+                    future.set_exception(e)
+
+    ipa_task = asyncio.create_task(stream_ipa()) if with_ipa else None
+
+    # Word lists: all target words are synthesized over shared TTS sessions, in the background
+    batched_audio = None
+    if args.mode in ("translation", "listening") and "tts" not in disabled:
+        print(f"🔊 {log_prefix}Synthesizing {total} audio clips in batch...")
+        batched_audio = asyncio.create_task(tts_call.generate_audio_batch(
+            [card.get('target', '') for card in vocab_list], target_lang
+        ))
+
+    # Listening: the prosody variants (slowed-down replay) are synthesized concurrently
+    variant_audio = None
+    if args.mode == "listening" and "tts" not in disabled:
+        variant_audio = asyncio.create_task(tts_call.generate_audio_variants(
+            [card.get('target', '') for card in vocab_list], target_lang
+        ))
+
+    # AnkiConnect: notes and media are sent while the next cards are being built
+    sink = ankiconnect.AnkiConnectSink(deck_name, args.ankiconnect) if args.ankiconnect else None
+
+    flashcards = [None] * total
+    explanation_bytes = [0, 0]  # before / after compaction
+
+    def plan(i: int, card: dict) -> dict:
+        if args.mode == "declension":
+            log_source = card.get('root_word', 'Unknown')
+            log_target = card.get('case_name_target', 'Unknown')
+        else:
+            log_source = card.get('source', 'Unknown')
+            log_target = card.get('target', 'Unknown')
+        print(f"   {log_prefix}[{i}/{total}] Processing: {log_source} -> {log_target}")
+
+        record = cards.from_vocab(card, args.mode)
+        tasks = {}
+
+        async def audio():
+            with profiling.stage(target_lang, i, log_source, "audio"):
+                if batched_audio is not None:
+                    record.audio = (await batched_audio)[i - 1]
+                    if variant_audio is not None:
+                        record.slow_audio = (await variant_audio)["slow"][i - 1]
+                else:
+                    record.audio, timings = await tts_call.generate_audio_with_timings(record.audio_text, target_lang)
+                    if record.clip_word:
+                        record.word_audio = tts_call.extract_word_clip(record.audio, timings, record.clip_word)
+
+        async def image():
+            with profiling.stage(target_lang, i, log_source, "image"):
+                record.image = await fetch_image(images, card['source'])
+
+        async def explanation():
+            with profiling.stage(target_lang, i, log_source, "explanation"):
+                if args.mode == "declension":
+                    html = await llm_call.generate_declension_explanation(
+                        card,
+                        source_lang=args.source,
+                        target_lang=target_lang
+                    )
+                else:
+                    html = await llm_call.generate_explanation(
+                        sentence=card['target'].replace("<", "").replace(">", ""),
+                        source_lang=args.source,
+                        target_lang=target_lang
+                    )
+            # Inline styles -> CSS classes, minified (smaller notes, collection and sync)
+            if html:
+                explanation_bytes[0] += len(html.encode("utf-8"))
+                html = html_compact.compact(html)
+                explanation_bytes[1] += len(html.encode("utf-8"))
+            record.explanation_html = html
+            # Rate limiting kindness
+            if args.explain:
+                await asyncio.sleep(1.5)
+
+        async def transcription():
+            with profiling.stage(target_lang, i, log_source, "ipa"):
+                record.ipa = await ipa_results[i - 1]
+
+        async def package():
+            with profiling.stage(target_lang, i, log_source, "card"):
+                flashcard = record.to_flashcard(args.mode)
+            if sink:
+                await sink.add(flashcard)
+            else:
+                flashcards[i - 1] = flashcard
+            events.emit("card_done", target_lang=target_lang, index=i, total=total, label=log_source)
+            if progress:
+                progress(target_lang, i, total)
+
+        if "tts" not in disabled and (batched_audio is not None or record.audio_text):
+            tasks["audio"] = scheduler.Task("tts", audio)
+        if args.mode == "translation" and "image" not in disabled:
+            tasks["image"] = scheduler.Task("image", image)
+        # Declension cards always get an explanation; others with --explain, from 3 words
+        if "llm" not in disabled and (args.mode == "declension" or (
+                args.explain and 'target' in card and len(card['target'].replace("<", "").replace(">", "").split()) >= 3)):
+            tasks["explanation"] = scheduler.Task("llm", explanation)
+        if with_ipa and record.text_for_ipa:
+            tasks["ipa"] = scheduler.Task("ipa", transcription)
+        tasks["package"] = scheduler.Task("package", package, deps=list(tasks))
+        return tasks
+
+    stages = scheduler.StageScheduler(STAGE_WORKERS, max_in_flight=CARDS_IN_FLIGHT)
+    try:
+        await stages.run(plan(i, card) for i, card in enumerate(vocab_list, 1))
+    finally:
+        if ipa_task:
+            ipa_task.cancel()
+    print(f"⚙️  {log_prefix}Stage utilization over {stages.elapsed:.1f}s:")
+    for line in stages.report():
+        print(f"     {line}")
+    events.emit("stage_utilization", target_lang=target_lang, elapsed=round(stages.elapsed, 3),
+                workers=STAGE_WORKERS, stages=stages.stats)
+    flashcards = [flashcard for flashcard in flashcards if flashcard is not None]
+
+    if sink:
+        await sink.close()
+        filename = args.ankiconnect
+        events.emit("notes_sent", target_lang=target_lang, url=filename, added=sink.added, rejected=sink.rejected)
+    else:
+        safe_topic = args.topic.replace(" ", "_").replace("/", "-")
+        filename = os.path.join(args.output_dir, f"anki_{safe_topic[:50]}_{target_lang}.apkg")
+        os.makedirs(args.output_dir, exist_ok=True)
+
+        if args.max_cards or args.max_media_mb:
+            # Several smaller packages, written in parallel processes (their allocations
+            # are not visible to --profile)
+            written = await anki_creator.create_deck_parts(
+                flashcards, deck_name=deck_name, output_file=filename, max_cards=args.max_cards,
+                max_media_bytes=int(args.max_media_mb * 1024 * 1024) if args.max_media_mb else None
+            )
+            filename = [path for path, _ in written]
+        else:
+            with profiling.track_allocations(f"package {os.path.basename(filename)}"):
+                anki_creator.create_deck(flashcards, deck_name=deck_name, output_file=filename)
+            written = [(filename, len(flashcards))]
+        for path, card_count in written:
+            events.emit("package_written", target_lang=target_lang, path=path, bytes=os.path.getsize(path),
+                        cards=card_count, parts=len(written))
+
+    before, after = explanation_bytes
+    if before:
+        print(f"🗜️  {log_prefix}Explanations compacted: {before} -> {after} bytes ({before - after} saved, -{100 * (before - after) / before:.0f}%)")
+    return filename
+
+async def request_vocab(args, count: int, exclude: list = None) -> list:
+    if len(args.targets) == 1:
+        return await llm_call.generate_vocab(
+            topic=args.topic,
+            source_lang=args.source,
+            target_lang=args.targets[0],
+            count=count,
+            mode=args.mode,
+            exclude=exclude
+        )
+    # One concept list, translated to every target language in the same request
+    return await llm_call.generate_vocab_multi(
+        topic=args.topic,
+        source_lang=args.source,
+        target_langs=args.targets,
+        count=count,
+        mode=args.mode,
+        exclude=exclude
+    )
+
+async def fetch_vocab(args) -> list:
+    """
+    Generates the vocabulary list (multi-target shape when there are several targets).
+    With --dedupe, near-duplicates are dropped before any audio / image / explanation
+    is paid for, and replaced by top-up requests (imported lists are only filtered).
+    """
+    if args.input:
+        vocab = await vocab_import.load_vocab(args.input, args.mode, args.source, args.targets,
+                                              fill=args.fill, limit=args.count, header=args.header)
+        if args.dedupe and vocab:
+            vocab, dropped = dedupe.filter_items(vocab, dedupe.NearDuplicateIndex(threshold=args.dedupe), args.mode, args.targets)
+            if dropped:
+                print(f"🧹 Near-duplicates: {len(dropped)} dropped, {len(vocab)} unique items kept.")
+        return vocab
+
+    vocab = await request_vocab(args, args.count)
+    if not args.dedupe or not vocab:
+        return vocab
+
+    index = dedupe.NearDuplicateIndex(threshold=args.dedupe)
+    vocab, dropped = dedupe.filter_items(vocab, index, args.mode, args.targets)
+    dropped_count = len(dropped)
+
+    for _ in range(DEDUPE_TOPUP_ROUNDS):
+        missing = args.count - len(vocab)
+        if not dropped or missing <= 0:
+            break
+        print(f"🧹 {len(dropped)} near-duplicates dropped, requesting {missing} replacements...")
+        seen = [dedupe.item_texts(card, args.mode, args.targets)[0] for card in vocab]
+        extra = await request_vocab(args, missing, exclude=seen)
+        extra, dropped = dedupe.filter_items(extra, index, args.mode, args.targets, limit=missing)
+        dropped_count += len(dropped)
+        vocab += extra
+
+    if dropped_count:
+        print(f"🧹 Near-duplicates: {dropped_count} dropped, {len(vocab)} unique items kept.")
+    return vocab
+
+async def generate_decks(args, progress=None) -> dict:
+    """
+    Generates the vocabulary list and builds one deck per target language.
+    Returns the written .apkg paths by target language. Raises ValueError if nothing can be generated.
+    'progress' is an optional callback(target_lang, index, total) called after each card.
+    """
+    if len(args.targets) > 1 and args.mode not in MULTI_TARGET_MODES:
+        raise ValueError(f"Several target languages are only supported in modes: {', '.join(MULTI_TARGET_MODES)}.")
+
+    # The backends are started and probed while the vocabulary is generated
+    vocab, readiness = await asyncio.gather(fetch_vocab(args), warmup.probe_backends(args))
+    warmup.print_report(readiness)
+    if len(args.targets) == 1:
+        vocab_lists = {args.targets[0]: vocab}
+    else:
+        vocab_lists = {lang: llm_call.split_multi_vocab(vocab, lang) for lang in args.targets}
+
+    events.emit("vocab_received", items=len(vocab), cards={lang: len(cards) for lang, cards in vocab_lists.items()})
+    if not any(vocab_lists.values()):
+        raise ValueError("No vocabulary generated.")
+
+    # Source-side assets don't depend on the target language: fetched once, shared by the decks
+    images = {}
+
+    deck_name = f"{args.mode.capitalize()}: {args.topic}"
+    languages = [lang for lang in args.targets if vocab_lists[lang]]
+    filenames = await asyncio.gather(*(
+        build_deck(
+            vocab_lists[lang], args, lang, images,
+            deck_name if len(args.targets) == 1 else f"{deck_name} ({lang.upper()})",
+            progress=progress,
+            disabled=warmup.disabled_stages(readiness, lang)
+        )
+        for lang in languages
+    ))
+    return dict(zip(languages, filenames))
+
 async def main():
     
     if len(sys.argv) == 1:
@@ -108,162 +584,61 @@ async def main():
         
     args = parse_arguments()
 
+    if args.events == "jsonl":
+        # stdout carries the events only
+        events.enable_jsonl(sys.stdout)
+        sys.stdout = sys.stderr
+
     print("╔═════════════════════════════════════════╗")
     print("║   AutoAnki - Flashcard Generator        ║")
     print("╚═════════════════════════════════════════╝")
     print(f"🔹 Topic:    {args.topic[:50]}..." if len(args.topic) > 50 else f"🔹 Topic:    {args.topic}")
     print(f"🔹 Mode:     {args.mode}")
-    print(f"🔹 Lang:     {args.source} -> {args.target}")
-    print(f"🔹 Count:    {args.count}")
+    print(f"🔹 Lang:     {args.source} -> {', '.join(args.targets)}")
+    if args.input:
+        print(f"🔹 Input:    {args.input}" + (f" (first {args.count} rows)" if args.count else ""))
+    else:
+        print(f"🔹 Count:    {args.count}")
     print("-------------------------------------------")
 
-    vocab_list = await llm_call.generate_vocab(
-        topic=args.topic,
-        source_lang=args.source,
-        target_lang=args.target,
-        count=args.count,
-        mode=args.mode 
-    )
-
-    if not vocab_list:
-        print("❌ No vocabulary generated. Exiting.")
+    if args.dry_run:
+        print_estimate(args)
+        return
+
+    llm_call.set_budget(args.budget)
+    if args.hedge:
+        resilience.enable_hedging(args.hedge)
+    if args.store:
+        artifact_store.open_store(args.store)
+
+    if args.record:
+        recorder.start_recording(args.record)
+    elif args.replay:
+        recorder.start_replay(args.replay, latency=args.replay_latency)
+
+    if args.profile:
+        profiling.start()
+
+    events.emit("job_start", topic=args.topic, mode=args.mode, source=args.source, targets=args.targets, count=args.count)
+    started = time.perf_counter()
+    try:
+        files = await generate_decks(args)
+        events.emit("job_end", files=files, duration=round(time.perf_counter() - started, 3), cost_usd=round(llm_call.spent(), 6))
+    except (ValueError, ankiconnect.AnkiConnectError) as e:
+        events.emit("job_error", error=str(e))
+        print(f"❌ {e} Exiting.")
         sys.exit(1)
-
-    flashcards = []
-    for i, card in enumerate(vocab_list, 1):
-        if args.mode == "declension":
-            log_source = card.get('root_word', 'Unknown')
-            log_target = card.get('case_name_target', 'Unknown')
-        else:
-            log_source = card.get('source', 'Unknown')
-            log_target = card.get('target', 'Unknown')
-            
-        print(f"   [{i}/{len(vocab_list)}] Processing: {log_source} -> {log_target}")
-
-        # Defaults
-        front = ""
-        back = ""
-        translation_text = ""
-        audio = None
-        image = None
-        text_for_ipa = ""
-
-        if args.mode == "custom":
-             # Custom mode: Direct mapping, minimal interference
-            front = card['source']
-            back = card['target']
-            audio = None
-            image = None
-            text_for_ipa = "" 
-
-        elif args.mode == "declension":
-            # Declension Mode Logic
-            # Keys: sentence_fr, sentence_pl_masked, root_word, declined_word, case_name_source, case_name_target
-            
-            # 1. Prepare data for Anki
-            translation_text = card['sentence_fr']
-            root_word = card['root_word']
-            declined_word = card['declined_word']
-            
-            # Case Info: "Genitif (Dopełniacz)"
-            case_info = f"{card['case_name_source']} ({card['case_name_target']})"
-            
-            # 2. Format the sentence for Cloze: "Nie widzę ___." -> "Nie widzę {{c1::kota}}."
-            # We assume sentence_pl_masked has "___"
-            full_sentence = card['sentence_pl_masked'].replace("___", f"{{{{c1::{declined_word}}}}}")
-            back = full_sentence # In our model, 'Sentence' uses this
-            
-            front = "" # Not used in this model's logic directly (template handles it)
-            
-            # 3. Audio & Explanation
-            raw_sentence = card['sentence_pl_masked'].replace("___", declined_word)
-            audio = await tts_call.generate_audio(raw_sentence, args.target)
-            
-            explanation_html = await llm_call.generate_explanation(
-                sentence=raw_sentence,
-                source_lang=args.source,
-                target_lang=args.target,
-                mode="declension"
-            )
-
-        elif args.mode == "listening":
-            front = card['source'] 
-            back = card['target']  
-            text_for_ipa = card['target']
-            audio = await tts_call.generate_audio(card['target'], args.target)
-            image = None 
-
-        elif args.mode == "cloze":
-            # Cloze:
-            # Source = word to guess (displayed in Extra)
-            # Target = sentence with <word>
-            # Translation = full sentence translation
-            front = card['source']
-            back = card['target']
-            text_for_ipa = "" # usually no IPA for full sentence cloze, or maybe yes? keeping empty for now as per previous logic
-            
-            translation_text = card.get('translation', '')
-
-            # Audio for the full sentence (removed < > for natural reading)
-            clean_sentence = card['target'].replace("<", "").replace(">", "")
-            audio = await tts_call.generate_audio(clean_sentence, args.target)
-            image = None
-
-        else: 
-            # Translation : Front = Source, Back = Target
-            front = card['source']
-            back = card['target']
-            text_for_ipa = card['target']
-
-            audio = await tts_call.generate_audio(back, args.target)
-            image = image_api.get(card['source'])
-
-        # --- Explanation Logic (General) ---
-        # Skip for declension as it handles its own explanation
-        if args.mode != "declension":
-            explanation_html = ""
-            target_sentence_for_expl = card['target'].replace("<", "").replace(">", "") if 'target' in card else ""
-            word_count = len(target_sentence_for_expl.split())
-            
-            if args.explain and word_count >= 3:
-                explanation_html = await llm_call.generate_explanation(
-                    sentence=target_sentence_for_expl,
-                    source_lang=args.source,
-                    target_lang=args.target
-                )
-
-        ipa_transcription = ipa.get_ipa(text_for_ipa, args.target) if text_for_ipa else ""
-        
-        # Prepare kwargs for 'declension' specifics
-        extra_kwargs = {}
-        if args.mode == "declension":
-            extra_kwargs = {
-                "root_word": root_word,
-                "case_info": case_info
-            }
-
-        flashcard = anki_creator.create_flashcard(
-            audio, 
-            image, 
-            front, 
-            back, 
-            ipa_text=ipa_transcription,
-            translation_text=translation_text,
-            explanation_text=explanation_html,
-            mode=args.mode,
-            **extra_kwargs
-        )
-        flashcards.append(flashcard)
-
-        # Rate limiting kindness
-        if args.explain:
-            await asyncio.sleep(1.5)
-
-    deck_name = f"{args.mode.capitalize()}: {args.topic}"
-    safe_topic = args.topic.replace(" ", "_").replace("/", "-")
-    filename = f"anki_{safe_topic[:50]}_{args.target}.apkg"
-    
-    anki_creator.create_deck(flashcards, deck_name=deck_name, output_file=filename)
+    finally:
+        ipa.get_engine().close()
+        llm_call.release_prompt_caches()
+        llm_call.print_usage_report()
+        artifact_store.print_report()
+        if args.hedge:
+            resilience.print_hedging_report()
+        recorder.stop()
+        if args.profile:
+            safe_topic = args.topic.replace(" ", "_").replace("/", "-")
+            profiling.stop_and_report(os.path.join(args.output_dir, f"anki_{safe_topic[:50]}"))
     
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Built-in profiling of a run (--profile).
+
+Captures a CPU profile of the whole run (cProfile), a timeline of the time each card
+spends awaiting in each stage (audio, image, explanation, IPA, card), and the
+allocation peak of the packaging step (tracemalloc). The report is written next
+to the .apkg: a .pstats file plus a readable summary.
+"""
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+import events
+
+_enabled = False
+_profiler = None
+_started = None
+_timeline = []      # (card, stage, start, end); card = (target_lang, index, label)
+_allocations = []   # (label, peak_bytes, seconds)
+
+def start():
+    global _enabled, _profiler, _started
+    _enabled = True
+    _timeline.clear()
+    _allocations.clear()
+    _started = time.perf_counter()
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+
+def is_enabled() -> bool:
+    return _enabled
+
+@contextlib.contextmanager
+def stage(target_lang: str, index: int, label: str, name: str):
+    """
+    Times one stage of one card (wall time, including the awaits inside the block).
+    Also reported as stage_start / stage_end events.
+    """
+    if not _enabled and not events.is_enabled():
+        yield
+        return
+    events.emit("stage_start", target_lang=target_lang, index=index, label=label, stage=name)
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if _enabled:
+            _timeline.append(((target_lang, index, label), name, begin, end))
+        events.emit("stage_end", target_lang=target_lang, index=index, label=label, stage=name,
+                    duration=round(end - begin, 4))
+
+@contextlib.contextmanager
+def track_allocations(label: str):
+    """
+    Records the allocation peak (and duration) of the block, e.g. writing a package.
+    """
+    if not _enabled:
+        yield
+        return
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        _allocations.append((label, peak, time.perf_counter() - begin))
+        if not already_tracing:
+            tracemalloc.stop()
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def stop_and_report(output_base: str, top: int = 15) -> str:
+    """
+    Stops profiling and writes <output_base>.pstats and <output_base>.profile.txt.
+    Returns the path of the summary.
+    """
+    global _enabled
+    _profiler.disable()
+    _enabled = False
+    total = time.perf_counter() - _started
+
+    directory = os.path.dirname(output_base)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    pstats_path = f"{output_base}.pstats"
+    _profiler.dump_stats(pstats_path)
+
+    lines = [f"AutoAnki profile — total wall time {total:.2f}s", ""]
+
+    # Hot functions
+    buffer = io.StringIO()
+    stats = pstats.Stats(_profiler, stream=buffer)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+    lines += [f"== Top {top} functions by own CPU time (main thread) ==", buffer.getvalue().strip(), ""]
+
+    # Stages
+    per_stage = {}
+    per_card = {}
+    for card, name, begin, end in _timeline:
+        per_stage.setdefault(name, []).append(end - begin)
+        per_card.setdefault(card, {}).setdefault(name, 0.0)
+        per_card[card][name] += end - begin
+
+    lines.append("== Time awaited per stage ==")
+    for name, durations in sorted(per_stage.items(), key=lambda item: -sum(item[1])):
+        lines.append(f"  {name:<12} total {sum(durations):7.2f}s   mean {sum(durations) / len(durations):6.3f}s   "
+                     f"max {max(durations):6.3f}s   ({len(durations)} cards)")
+    lines.append("")
+
+    lines.append("== Slowest cards ==")
+    slowest = sorted(per_card.items(), key=lambda item: -sum(item[1].values()))[:10]
+    for (target_lang, index, label), stages in slowest:
+        detail = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stages.items())
+        lines.append(f"  [{target_lang} #{index}] {label[:40]:<40} {sum(stages.values()):6.2f}s  ({detail})")
+    lines.append("")
+
+    lines.append("== Packaging allocations ==")
+    for label, peak, seconds in _allocations:
+        lines.append(f"  {label}: peak {_format_size(peak)} in {seconds:.2f}s")
+
+    summary_path = f"{output_base}.profile.txt"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    print(f"📊 Profile written: {summary_path} (+ {pstats_path})")
+    return summary_path
@@ -0,0 +1,191 @@
+"""
+Record / replay of every external call (Gemini, Edge TTS, DuckDuckGo, image hosts).
+
+--record DIR captures each request with its response (or error) and timing.
+--replay DIR serves them back without touching the network, either at the recorded
+latency or instantly, so a production run can be reproduced exactly and the local
+parts of the pipeline (packaging, orchestration) can be benchmarked in isolation.
+
+Layout of DIR:
+  calls.jsonl        one line per call: kind, key, seq, elapsed, result or error
+  blobs/<sha256>     binary payloads (audio, images), stored once
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+
+import resilience
+
+class ReplayMiss(LookupError):
+    """The replayed recording has no entry for this request."""
+
+class ReplayedError(Exception):
+    """A non-transient error that was raised by the backend during the recording."""
+
+_mode = None            # None, "record" or "replay"
+_directory = None
+_latency = "recorded"   # replay: "recorded" or "zero"
+_entries = {}           # replay: (kind, key) -> [entries]
+_counters = {}          # (kind, key) -> number of calls seen in this run
+_lock = threading.Lock()
+
+def start_recording(directory: str):
+    global _mode, _directory
+    os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+    _mode, _directory = "record", directory
+    _counters.clear()
+    print(f"⏺️  Recording external calls to '{directory}'.")
+
+def start_replay(directory: str, latency: str = "recorded"):
+    global _mode, _directory, _latency
+    path = os.path.join(directory, "calls.jsonl")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No recording found in '{directory}'.")
+
+    _entries.clear()
+    _counters.clear()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            _entries.setdefault((entry["kind"], entry["key"]), []).append(entry)
+    _mode, _directory, _latency = "replay", directory, latency
+    print(f"⏯️  Replaying {sum(map(len, _entries.values()))} recorded calls from '{directory}' (latency: {latency}).")
+
+def stop():
+    global _mode
+    _mode = None
+
+def is_replaying() -> bool:
+    return _mode == "replay"
+
+# --- Serialization: JSON, with bytes stored as blobs ---
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(_directory, "blobs", digest)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
+        return {"__bytes__": digest}
+    if isinstance(value, tuple):
+        return {"__tuple__": [_encode(v) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    return value
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        if "__bytes__" in value:
+            with open(os.path.join(_directory, "blobs", value["__bytes__"]), "rb") as f:
+                return f.read()
+        if "__tuple__" in value:
+            return tuple(_decode(v) for v in value["__tuple__"])
+        return {k: _decode(v) for k, v in value.items()}
+    return value
+
+def _make_key(parts) -> str:
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _next_seq(kind: str, key: str) -> int:
+    with _lock:
+        seq = _counters.get((kind, key), 0)
+        _counters[(kind, key)] = seq + 1
+        return seq
+
+def _write(entry: dict):
+    with _lock:
+        with open(os.path.join(_directory, "calls.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+def _record(kind, key, seq, started, result=None, error=None, is_transient=None):
+    entry = {"kind": kind, "key": key, "seq": seq, "elapsed": round(time.perf_counter() - started, 4)}
+    if error is not None:
+        transient = isinstance(error, (resilience.TransientError, asyncio.TimeoutError)) or bool(is_transient and is_transient(error))
+        entry["error"] = {"message": str(error) or type(error).__name__, "transient": transient}
+    else:
+        entry["result"] = _encode(result)
+    _write(entry)
+
+def _lookup(kind: str, key: str) -> dict:
+    entries = _entries.get((kind, key))
+    if not entries:
+        raise ReplayMiss(f"No recorded '{kind}' call for this request.")
+    seq = _next_seq(kind, key)
+    # A call repeated more often than during the recording gets the last response
+    return entries[min(seq, len(entries) - 1)]
+
+def _replay_result(entry: dict):
+    if "error" in entry:
+        error_class = resilience.TransientError if entry["error"]["transient"] else ReplayedError
+        raise error_class(entry["error"]["message"])
+    return _decode(entry["result"])
+
+def recordable(kind: str, key=None, dump=None, load=None, is_transient=None):
+    """
+    Decorator for the functions that talk to an external service.
+    key(*args, **kwargs): request identity (defaults to all the arguments).
+    dump(result) / load(data): conversion of results that aren't plain JSON/bytes.
+    is_transient(exception): used to replay errors with the same retry behavior.
+    """
+    def decorator(fn):
+        def request_key(args, kwargs):
+            return _make_key(key(*args, **kwargs) if key else [args, kwargs])
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                if _mode is None:
+                    return await fn(*args, **kwargs)
+                request = request_key(args, kwargs)
+                if _mode == "replay":
+                    entry = _lookup(kind, request)
+                    if _latency == "recorded":
+                        await asyncio.sleep(entry["elapsed"])
+                    result = _replay_result(entry)
+                    return load(result) if load else result
+
+                seq = _next_seq(kind, request)
+                started = time.perf_counter()
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    _record(kind, request, seq, started, error=e, is_transient=is_transient)
+                    raise
+                _record(kind, request, seq, started, result=dump(result) if dump else result)
+                return result
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if _mode is None:
+                    return fn(*args, **kwargs)
+                request = request_key(args, kwargs)
+                if _mode == "replay":
+                    entry = _lookup(kind, request)
+                    if _latency == "recorded":
+                        time.sleep(entry["elapsed"])
+                    result = _replay_result(entry)
+                    return load(result) if load else result
+
+                seq = _next_seq(kind, request)
+                started = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    _record(kind, request, seq, started, error=e, is_transient=is_transient)
+                    raise
+                _record(kind, request, seq, started, result=dump(result) if dump else result)
+                return result
+
+        return wrapper
+    return decorator
@@ -0,0 +1,253 @@
+"""
+Shared resilience layer for every external call (Gemini, Edge TTS, DuckDuckGo, image hosts).
+
+Each backend gets its own policy: a deadline per attempt, a number of jittered retries
+on transient errors, and a circuit breaker. When a provider keeps failing, the breaker
+opens and calls fail fast with CircuitOpenError, so callers can degrade (skip the
+image / audio / explanation) instead of waiting for the timeout on every card.
+
+Optional hedging (enable_hedging): a hedgeable call that hasn't answered by the p95
+latency of its backend gets a duplicate request (e.g. the next candidate image URL),
+and the first answer wins. The share of hedged calls is capped.
+"""
+import asyncio
+import collections
+import random
+import time
+
+import events
+
+class TransientError(Exception):
+    """A failure worth retrying (overload, rate limit, timeout, network)."""
+
+class CircuitOpenError(Exception):
+    """Raised without calling the backend while its circuit breaker is open."""
+
+class Policy:
+    def __init__(self, deadline: float, retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0,
+                 failure_threshold: int = 5, reset_after: float = 30.0):
+        self.deadline = deadline                    # seconds, per attempt
+        self.retries = retries                      # extra attempts after the first one
+        self.base_delay = base_delay                # backoff: random(0, base_delay * 2^attempt)
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold  # consecutive failures before opening the circuit
+        self.reset_after = reset_after              # seconds before a trial call is let through
+
+POLICIES = {
+    "gemini": Policy(deadline=90, retries=3, base_delay=2, max_delay=20),
+    "tts": Policy(deadline=30, retries=2),
+    "image_search": Policy(deadline=8, retries=1, base_delay=1),
+    "image_download": Policy(deadline=5, retries=1),
+}
+
+class CircuitBreaker:
+    def __init__(self, name: str, policy: Policy):
+        self.name = name
+        self.policy = policy
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False      # half-open: the single trial call is running
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        # Half-open: let one trial call through once the cool-down is over,
+        # the others keep failing fast until it returns
+        if self.trial or time.monotonic() - self.opened_at < self.policy.reset_after:
+            return False
+        self.trial = True
+        return True
+
+    def end_trial(self):
+        self.trial = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self):
+        self.trial = False
+        self.failures += 1
+        if self.failures >= self.policy.failure_threshold:
+            if self.opened_at is None:
+                print(f"⚡ '{self.name}' keeps failing: skipping it for {self.policy.reset_after:.0f}s.")
+            self.opened_at = time.monotonic()
+
+class LatencyTracker:
+    """
+    Recent latencies of single requests to one backend.
+    The request that loses a hedge is left to finish (within the deadline), so its
+    real latency is known: it is the one the caller would have waited without hedging.
+    """
+    def __init__(self, window: int = 500):
+        self.requests = collections.deque(maxlen=window)   # one request
+        self.delivered = collections.deque(maxlen=window)  # what the caller waited (hedged calls)
+
+    def percentile(self, q: float, samples=None) -> float | None:
+        samples = sorted(self.requests if samples is None else samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+_breakers = {}
+_trackers = {}
+
+# Hedging: off by default. MIN_SAMPLES latencies are needed before trusting the p95.
+HEDGE_MIN_SAMPLES = 20
+_hedge_max_rate = None  # max share of hedgeable calls that get a duplicate
+
+# Per backend: calls, retries, timeouts, failures, short_circuits
+STATS = {}
+
+def get_breaker(backend: str, key: str = None) -> CircuitBreaker:
+    """
+    The breaker of a backend, or of one `key` of it (e.g. one voice) under the backend's policy.
+    """
+    name = key or backend
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name, POLICIES[backend])
+    return _breakers[name]
+
+def get_tracker(backend: str) -> LatencyTracker:
+    if backend not in _trackers:
+        _trackers[backend] = LatencyTracker()
+    return _trackers[backend]
+
+def enable_hedging(max_rate: float = 0.05):
+    global _hedge_max_rate
+    _hedge_max_rate = max_rate
+
+def _count(backend: str, key: str):
+    stats = STATS.setdefault(backend, {"calls": 0, "retries": 0, "timeouts": 0, "failures": 0, "short_circuits": 0,
+                                       "hedgeable": 0, "hedges": 0, "hedge_wins": 0})
+    stats[key] += 1
+
+async def _invoke(fn, args, kwargs):
+    if asyncio.iscoroutinefunction(fn):
+        return await fn(*args, **kwargs)
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+async def _timed(tracker: LatencyTracker, fn, args, kwargs):
+    started = time.perf_counter()
+    try:
+        result = await _invoke(fn, args, kwargs)
+    except asyncio.CancelledError:
+        tracker.requests.append(time.perf_counter() - started)
+        raise
+    tracker.requests.append(time.perf_counter() - started)
+    return result
+
+async def _hedged(backend: str, fn, args, hedge_args, kwargs):
+    """
+    Runs one attempt, with a duplicate request (hedge_args) if the first one is slower
+    than the backend's p95. Returns the first successful answer.
+    """
+    tracker = get_tracker(backend)
+    stats = STATS[backend]
+    started = time.perf_counter()
+    _count(backend, "hedgeable")
+    tasks = [asyncio.ensure_future(_timed(tracker, fn, args, kwargs))]
+    won = False
+    try:
+        p95 = tracker.percentile(0.95) if len(tracker.requests) >= HEDGE_MIN_SAMPLES else None
+        if _hedge_max_rate and p95 is not None and stats["hedges"] < _hedge_max_rate * stats["hedgeable"]:
+            done, _ = await asyncio.wait(tasks, timeout=p95)
+            if not done:
+                _count(backend, "hedges")
+                tasks.append(asyncio.ensure_future(_timed(tracker, fn, hedge_args, kwargs)))
+
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        _count(backend, "hedge_wins")
+                    tracker.delivered.append(time.perf_counter() - started)
+                    won = True
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if task.done():
+                continue
+            if won:
+                # The loser finishes in the background (bounded by the deadline) to measure it
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                asyncio.get_running_loop().call_later(POLICIES[backend].deadline, task.cancel)
+            else:
+                task.cancel()
+
+async def call(backend: str, fn, *args, is_transient=None, deadline: float = None, hedge_args: tuple = None,
+               breaker_key: str = None, **kwargs):
+    """
+    Calls `fn(*args, **kwargs)` under the backend's policy. `fn` can be a coroutine
+    function or a blocking function (run in a thread).
+    With `hedge_args`, the call is hedgeable: a slow attempt is duplicated as
+    `fn(*hedge_args, **kwargs)` when hedging is enabled.
+    `is_transient(exception) -> bool` tells which errors are worth a retry
+    (TransientError and timeouts always are). Other errors are raised right away;
+    transient ones are raised as TransientError once the retries are exhausted.
+    Raises CircuitOpenError while the backend is considered down. With `breaker_key`,
+    the failures are counted by that key (e.g. one voice) instead of the whole backend.
+    """
+    policy = POLICIES[backend]
+    breaker = get_breaker(backend, breaker_key)
+    deadline = deadline or policy.deadline
+
+    for attempt in range(policy.retries + 1):
+        if not breaker.allow():
+            _count(backend, "short_circuits")
+            raise CircuitOpenError(f"'{breaker.name}' is temporarily disabled")
+        is_trial = breaker.trial
+
+        _count(backend, "calls")
+        try:
+            if hedge_args is not None:
+                result = await asyncio.wait_for(_hedged(backend, fn, args, hedge_args, kwargs), timeout=deadline)
+            else:
+                result = await asyncio.wait_for(_invoke(fn, args, kwargs), timeout=deadline)
+            breaker.record_success()
+            return result
+
+        except Exception as e:
+            timed_out = isinstance(e, asyncio.TimeoutError)
+            transient = timed_out or isinstance(e, TransientError) or bool(is_transient and is_transient(e))
+            if timed_out:
+                _count(backend, "timeouts")
+            if not transient:
+                raise
+
+            breaker.record_failure()
+            if attempt == policy.retries:
+                _count(backend, "failures")
+                if timed_out:
+                    raise TransientError(f"'{backend}' did not answer within {deadline:.0f}s") from e
+                if isinstance(e, TransientError):
+                    raise
+                raise TransientError(f"'{backend}' failed after {attempt + 1} attempts: {e}") from e
+
+            wait_time = random.uniform(0, min(policy.max_delay, policy.base_delay * (2 ** attempt)))
+            _count(backend, "retries")
+            events.emit("retry", backend=backend, attempt=attempt + 1, delay=round(wait_time, 2), error=str(e) or type(e).__name__)
+            print(f"⚠️ '{backend}' failed ({e or type(e).__name__}), retrying in {wait_time:.1f}s... (Attempt {attempt + 1}/{policy.retries + 1})")
+            await asyncio.sleep(wait_time)
+        finally:
+            # Non-transient error or cancellation: the next call may be the trial
+            if is_trial:
+                breaker.end_trial()
+
+def print_hedging_report():
+    """
+    Hedged calls per backend, and the p99 latency of single requests vs. what callers waited.
+    """
+    for backend, tracker in _trackers.items():
+        stats = STATS.get(backend, {})
+        if not stats.get("hedgeable") or not tracker.delivered:
+            continue
+        p99_single = tracker.percentile(0.99)
+        p99_delivered = tracker.percentile(0.99, tracker.delivered)
+        print(f"🪁 Hedging '{backend}': {stats['hedges']}/{stats['hedgeable']} calls hedged "
+              f"({stats['hedge_wins']} won by the duplicate), p99 {p99_single:.2f}s -> {p99_delivered:.2f}s.")
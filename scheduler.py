@@ -0,0 +1,143 @@
+"""
+Stage-graph scheduler for the per-card pipeline.
+
+Each card is split into tasks (TTS, image, explanation, IPA, packaging...) that declare
+the tasks they depend on. Every stage has its own queue and its own number of workers,
+so a slow Gemini call only holds an LLM worker while TTS and image workers move on to
+the next cards. A bounded number of cards is in flight at a time, and queued tasks of
+the cards nearest completion run first, so finished cards leave memory early.
+"""
+import asyncio
+import itertools
+import time
+
+class Task:
+    def __init__(self, stage: str, fn, deps=()):
+        self.stage = stage
+        self.fn = fn            # async callable, no arguments
+        self.deps = set(deps)   # names of the tasks of the same card that must be done first
+
+class _Job:
+    def __init__(self, order: int, tasks: dict):
+        self.order = order
+        self.tasks = tasks
+        self.remaining = set(tasks)
+        self.queued = set()
+
+    def ready(self) -> list:
+        return [name for name in self.remaining
+                if name not in self.queued and not (self.tasks[name].deps & self.remaining)]
+
+class StageScheduler:
+    def __init__(self, workers: dict, max_in_flight: int = 32):
+        """
+        workers: number of workers per stage name. max_in_flight: cards admitted at once.
+        """
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.stats = {stage: {"tasks": 0, "busy": 0.0, "waited": 0.0} for stage in workers}
+        self.elapsed = 0.0
+
+    async def run(self, plans):
+        """
+        plans: iterable of {task name: Task} dicts, one per card (consumed lazily, as
+        cards are admitted). Returns once every task ran; the first error is raised
+        (a RuntimeError for a task that was cancelled).
+        """
+        queues = {stage: asyncio.PriorityQueue(maxsize=self.max_in_flight) for stage in self.workers}
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tie_breaker = itertools.count()
+        in_flight = set()
+        finished = asyncio.Event()
+        feeding_done = False
+        failure = []
+
+        async def enqueue(job: _Job):
+            for name in job.ready():
+                job.queued.add(name)
+                # Fewest remaining tasks first, then the oldest card
+                priority = (len(job.remaining), job.order, next(tie_breaker))
+                await queues[job.tasks[name].stage].put((priority, job, name, time.perf_counter()))
+
+        async def worker(stage: str):
+            stats = self.stats[stage]
+            queue = queues[stage]
+            while True:
+                _, job, name, queued_at = await queue.get()
+                begin = time.perf_counter()
+                stats["waited"] += begin - queued_at
+                try:
+                    await job.tasks[name].fn()
+                except (Exception, asyncio.CancelledError) as e:
+                    # A task awaiting a cancelled shared future fails its card like any
+                    # other error; only the worker's own cancellation propagates
+                    if isinstance(e, asyncio.CancelledError):
+                        if asyncio.current_task().cancelling():
+                            raise
+                        error = RuntimeError(f"{stage} task '{name}' of card {job.order + 1} was cancelled")
+                        error.__cause__ = e
+                        e = error
+                    failure.append(e)
+                    finished.set()
+                    return
+                finally:
+                    stats["busy"] += time.perf_counter() - begin
+                    stats["tasks"] += 1
+                    queue.task_done()
+
+                job.remaining.discard(name)
+                if job.remaining:
+                    await enqueue(job)
+                else:
+                    in_flight.discard(job)
+                    slots.release()
+                    if feeding_done and not in_flight:
+                        finished.set()
+
+        async def feed():
+            nonlocal feeding_done
+            try:
+                for order, tasks in enumerate(plans):
+                    await slots.acquire()
+                    job = _Job(order, tasks)
+                    if not tasks:
+                        slots.release()
+                        continue
+                    in_flight.add(job)
+                    await enqueue(job)
+            except Exception as e:
+                # An error while building the plans ends the run instead of hanging it
+                failure.append(e)
+                finished.set()
+                return
+            feeding_done = True
+            if not in_flight:
+                finished.set()
+
+        started = time.perf_counter()
+        workers = [asyncio.create_task(worker(stage)) for stage, count in self.workers.items() for _ in range(count)]
+        feeder = asyncio.create_task(feed())
+        try:
+            await finished.wait()
+        finally:
+            for task in workers + [feeder]:
+                task.cancel()
+            await asyncio.gather(*workers, feeder, return_exceptions=True)
+            self.elapsed += time.perf_counter() - started
+
+        if failure:
+            raise failure[0]
+
+    def report(self) -> list:
+        """
+        One line per stage: tasks run, utilization of its workers, mean queue wait.
+        """
+        lines = []
+        for stage, stats in self.stats.items():
+            if not stats["tasks"]:
+                continue
+            capacity = self.elapsed * self.workers[stage]
+            utilization = 100 * stats["busy"] / capacity if capacity else 0.0
+            lines.append(f"{stage:<8} {stats['tasks']:>5} tasks  {self.workers[stage]} workers  "
+                         f"busy {utilization:5.1f}%  mean wait {stats['waited'] / stats['tasks']:.2f}s")
+        return lines
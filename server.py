@@ -0,0 +1,263 @@
+"""
+Long-running local generation service.
+
+The Gemini client, the IPA process pool and the prompt caches stay warm across jobs.
+Jobs go through a bounded queue consumed by a fixed pool of workers. Each job has its
+own LLM usage and budget; finished jobs and their decks are removed after --job-ttl.
+
+Endpoints:
+  POST /jobs                      Submit a job: {"topic", "target", "source", "count", "mode", "explain", "dedupe", "budget"}
+  GET  /jobs                      List jobs
+  GET  /jobs/{id}                 Job status
+  GET  /jobs/{id}/events          Progress, streamed as JSON lines until the job ends
+  GET  /jobs/{id}/download        The .apkg (?lang=pl when the job has several targets)
+"""
+import asyncio
+import argparse
+import json
+import os
+import shutil
+import time
+import uuid
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Custom modules
+import ipa
+import llm_call
+import main as pipeline
+
+class Job:
+    def __init__(self, params: dict, output_dir: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.output_dir = os.path.join(output_dir, self.id)
+        self.status = "queued"
+        self.error = None
+        self.files = {}
+        self.cost = 0.0
+        self.events = []
+        self.created = time.time()
+        self.finished = None
+        self._changed = asyncio.Condition()
+        self._emitting = set()   # emit tasks scheduled from sync code, kept until done
+
+    def emit_soon(self, event: str, **data):
+        """
+        emit() from synchronous code running in the event loop (progress callbacks).
+        """
+        task = asyncio.get_running_loop().create_task(self.emit(event, **data))
+        self._emitting.add(task)
+        task.add_done_callback(self._emitting.discard)
+
+    async def emit(self, event: str, **data):
+        self.events.append({"event": event, "time": round(time.time() - self.created, 3), **data})
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def wait_for_event(self, seen: int):
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self.events) > seen)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "error": self.error,
+            "files": list(self.files),
+            "cost_usd": self.cost,
+        }
+
+def _job_args(job: Job):
+    """
+    Builds the same arguments object the CLI would produce for this job.
+    """
+    params = job.params
+    targets = [lang.strip() for lang in str(params["target"]).split(",") if lang.strip()]
+    return argparse.Namespace(
+        topic=params["topic"],
+        target=",".join(targets),
+        targets=targets,
+        source=params.get("source", "fr"),
+        count=int(params.get("count", 5)),
+        mode=params.get("mode", "translation"),
+        explain=bool(params.get("explain", False)),
+        output_dir=job.output_dir,
+        ankiconnect=None,
+        max_cards=None,
+        max_media_mb=None,
+        dedupe=float(params["dedupe"]) if params.get("dedupe") else None,
+        budget=float(params["budget"]) if params.get("budget") else None,
+        input=None,
+        fill=False,
+        header=None,
+    )
+
+async def _run_job(job: Job):
+    def on_progress(target_lang, index, total):
+        job.emit_soon("card", lang=target_lang, index=index, total=total)
+
+    job.status = "running"
+    await job.emit("started")
+    try:
+        os.makedirs(job.output_dir, exist_ok=True)
+        args = _job_args(job)
+        # Usage and budget of this job only, not shared with the jobs running next to it
+        llm_call.start_account(args.budget)
+        job.files = await pipeline.generate_decks(args, progress=on_progress)
+        job.status = "done"
+        job.cost = round(llm_call.spent(), 6)
+        await job.emit("done", files=list(job.files), cost_usd=job.cost)
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.cost = round(llm_call.spent(), 6)
+        await job.emit("failed", error=job.error)
+    finally:
+        job.finished = time.time()
+
+async def _worker(app: web.Application):
+    queue = app["queue"]
+    while True:
+        job = await queue.get()
+        try:
+            # In a task of its own: the job's LLM account doesn't leak into the next job
+            await asyncio.create_task(_run_job(job))
+        finally:
+            queue.task_done()
+
+def expire_jobs(jobs: dict, ttl: float) -> list:
+    """
+    Forgets the jobs finished more than `ttl` seconds ago and deletes their decks.
+    Returns the ids of the expired jobs.
+    """
+    now = time.time()
+    expired = [job for job in jobs.values() if job.finished is not None and now - job.finished > ttl]
+    for job in expired:
+        del jobs[job.id]
+        shutil.rmtree(job.output_dir, ignore_errors=True)
+    return [job.id for job in expired]
+
+async def _expire_loop(app: web.Application):
+    while True:
+        await asyncio.sleep(min(60, app["job_ttl"]))
+        expire_jobs(app["jobs"], app["job_ttl"])
+
+# --- Handlers ---
+
+async def submit_job(request: web.Request) -> web.Response:
+    try:
+        params = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text="Body must be JSON.")
+    if not isinstance(params, dict):
+        raise web.HTTPBadRequest(text="Body must be a JSON object.")
+    if not params.get("topic") or not params.get("target"):
+        raise web.HTTPBadRequest(text="'topic' and 'target' are required.")
+
+    job = Job(params, request.app["output_dir"])
+    try:
+        request.app["queue"].put_nowait(job)
+    except asyncio.QueueFull:
+        raise web.HTTPServiceUnavailable(text="Job queue is full, retry later.")
+
+    request.app["jobs"][job.id] = job
+    await job.emit("queued", position=request.app["queue"].qsize())
+    return web.json_response(job.to_dict(), status=202)
+
+def _get_job(request: web.Request) -> Job:
+    job = request.app["jobs"].get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(text="Unknown job.")
+    return job
+
+async def list_jobs(request: web.Request) -> web.Response:
+    return web.json_response([job.to_dict() for job in request.app["jobs"].values()])
+
+async def get_job(request: web.Request) -> web.Response:
+    return web.json_response(_get_job(request).to_dict())
+
+async def stream_events(request: web.Request) -> web.StreamResponse:
+    job = _get_job(request)
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+
+    seen = 0
+    while True:
+        while seen < len(job.events):
+            await response.write((json.dumps(job.events[seen], ensure_ascii=False) + "\n").encode("utf-8"))
+            seen += 1
+        if job.status in ("done", "failed"):
+            break
+        await job.wait_for_event(seen)
+
+    await response.write_eof()
+    return response
+
+async def download(request: web.Request) -> web.FileResponse:
+    job = _get_job(request)
+    if job.status != "done":
+        raise web.HTTPConflict(text=f"Job is {job.status}.")
+
+    lang = request.query.get("lang") or next(iter(job.files))
+    path = job.files.get(lang)
+    if not path:
+        raise web.HTTPNotFound(text=f"No deck for language '{lang}'.")
+    return web.FileResponse(path, headers={
+        "Content-Disposition": f'attachment; filename="{os.path.basename(path)}"'
+    })
+
+# --- App lifecycle ---
+
+async def _start_workers(app: web.Application):
+    app["workers"] = [asyncio.create_task(_worker(app)) for _ in range(app["worker_count"])]
+    app["workers"].append(asyncio.create_task(_expire_loop(app)))
+
+async def _stop_workers(app: web.Application):
+    for task in app["workers"]:
+        task.cancel()
+    await asyncio.gather(*app["workers"], return_exceptions=True)
+    ipa.get_engine().close()
+    llm_call.release_prompt_caches()
+
+def create_app(workers: int = 2, queue_size: int = 20, output_dir: str = "jobs", job_ttl: float = 3600) -> web.Application:
+    app = web.Application()
+    app["worker_count"] = workers
+    app["job_ttl"] = job_ttl
+    app["queue"] = asyncio.Queue(maxsize=queue_size)
+    app["jobs"] = {}
+    app["output_dir"] = output_dir
+
+    app.router.add_post("/jobs", submit_job)
+    app.router.add_get("/jobs", list_jobs)
+    app.router.add_get("/jobs/{job_id}", get_job)
+    app.router.add_get("/jobs/{job_id}/events", stream_events)
+    app.router.add_get("/jobs/{job_id}/download", download)
+
+    app.on_startup.append(_start_workers)
+    app.on_cleanup.append(_stop_workers)
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="AutoAnki: local generation service",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument("--workers", type=int, default=2, help="Number of jobs processed concurrently.")
+    parser.add_argument("--queue-size", type=int, default=20, help="Max number of jobs waiting in the queue.")
+    parser.add_argument("--output-dir", type=str, default="jobs", help="Directory where job decks are written.")
+    parser.add_argument("--job-ttl", type=float, default=3600, help="Seconds a finished job and its decks are kept.")
+    args = parser.parse_args()
+
+    print(f"🚀 AutoAnki service on http://{args.host}:{args.port} ({args.workers} workers)")
+    web.run_app(
+        create_app(args.workers, args.queue_size, args.output_dir, args.job_ttl),
+        host=args.host,
+        port=args.port,
+        print=None
+    )
@@ -1,33 +1,443 @@
+import asyncio
+import json
+import re
+import weakref
+import zlib
+import aiohttp
 import edge_tts
+from edge_tts import exceptions as edge_tts_errors
 
-VOICE_MAPPING = {
-    "fr": "fr-FR-VivienneNeural",     
-    "pl": "pl-PL-MarekNeural",         
-    "en": "en-US-RogerNeural",         
-    "es": "es-ES-AlvaroNeural",        
-    "de": "de-DE-ConradNeural",        
-    "it": "it-IT-DiegoNeural",         
-    "pt": "pt-PT-DuarteNeural",        
-    "ru": "ru-RU-DmitryNeural",        
-    "ja": "ja-JP-KeitaNeural",         
-    "zh": "zh-CN-YunxiNeural"          
+import artifact_store
+import recorder
+import resilience
+
+# Voices per language. Each text is always read by the same voice of the pool (speaker
+# variety across cards, stable store keys across runs); the next voices are its fallbacks.
+VOICE_POOLS = {
+    "fr": ["fr-FR-VivienneNeural", "fr-FR-DeniseNeural", "fr-FR-HenriNeural"],
+    "pl": ["pl-PL-MarekNeural", "pl-PL-ZofiaNeural"],
+    "en": ["en-US-RogerNeural", "en-US-AriaNeural", "en-US-GuyNeural"],
+    "es": ["es-ES-AlvaroNeural", "es-ES-ElviraNeural"],
+    "de": ["de-DE-ConradNeural", "de-DE-KatjaNeural", "de-DE-KillianNeural"],
+    "it": ["it-IT-DiegoNeural", "it-IT-ElsaNeural", "it-IT-IsabellaNeural"],
+    "pt": ["pt-PT-DuarteNeural", "pt-PT-RaquelNeural"],
+    "ru": ["ru-RU-DmitryNeural", "ru-RU-SvetlanaNeural"],
+    "ja": ["ja-JP-KeitaNeural", "ja-JP-NanamiNeural"],
+    "zh": ["zh-CN-YunxiNeural", "zh-CN-XiaoxiaoNeural", "zh-CN-YunyangNeural"],
+}
+VOICE_MAPPING = {lang: voices[0] for lang, voices in VOICE_POOLS.items()}
+DEFAULT_VOICE = "en-US-RogerNeural"
+
+# Sessions running at once on one voice
+VOICE_CONCURRENCY = 2
+
+# Edge TTS streams audio-24khz-48kbitrate-mono-mp3 (CBR): 6000 bytes per second.
+# Offsets in the boundary metadata are expressed in 100ns ticks.
+TICKS_PER_SECOND = 10_000_000
+BYTES_PER_SECOND = 6000
+
+# Prosody variants synthesized next to the normal audio (edge_tts rate / pitch / volume)
+PROSODY_VARIANTS = {
+    "slow": {"rate": "-30%"},
 }
 
-async def generate_audio(text: str, target_language: str) -> bytes:
+# Batching: max characters sent in one websocket session, and max parallel
+# sessions when we fall back to one request per utterance.
+BATCH_MAX_CHARS = 1500
+FALLBACK_CONCURRENCY = 4
+
+SENTENCE_END = ".!?。！？"
+
+def _is_transient(e: Exception) -> bool:
+    return isinstance(e, (aiohttp.ClientError, edge_tts_errors.NoAudioReceived, edge_tts_errors.WebSocketError))
+
+def _get_voice(target_language: str) -> str:
+    return VOICE_MAPPING.get(target_language.lower(), DEFAULT_VOICE)
+
+def _get_voices(target_language: str, text: str) -> list:
+    """
+    The voice pool of the language, starting at the voice assigned to `text`.
+    """
+    pool = VOICE_POOLS.get(target_language.lower(), [DEFAULT_VOICE])
+    start = zlib.crc32(text.encode("utf-8")) % len(pool)
+    return pool[start:] + pool[:start]
+
+_voice_slots = weakref.WeakKeyDictionary()   # event loop -> {voice: semaphore}
+
+def _voice_slot(voice: str) -> asyncio.Semaphore:
+    slots = _voice_slots.setdefault(asyncio.get_running_loop(), {})
+    if voice not in slots:
+        slots[voice] = asyncio.Semaphore(VOICE_CONCURRENCY)
+    return slots[voice]
+
+def _voice_breaker(voice: str) -> str:
+    # One throttled voice must not open the circuit of the whole "tts" backend
+    return f"tts:{voice}"
+
+async def _on_voices(voices: list, fn, take_slot: bool = True):
+    """
+    Awaits fn(voice) for the first voice, within its concurrency limit, and moves on to
+    the next voice when it fails (after the retries), throttles, or has its circuit
+    breaker open (each voice has its own, see _voice_breaker).
+    take_slot=False when fn takes the voice slots itself (hedgeable calls).
+    Returns (voice used, result); the error of the last voice is raised.
+    """
+    for attempt, voice in enumerate(voices):
+        try:
+            if not take_slot:
+                return voice, await fn(voice)
+            async with _voice_slot(voice):
+                return voice, await fn(voice)
+        except Exception as e:
+            if attempt == len(voices) - 1:
+                raise
+            if not isinstance(e, resilience.CircuitOpenError):
+                print(f"⚠️ Voice {voice} failed ({e}), switching to {voices[attempt + 1]}.")
+
+async def _find_stored(store, voices: list, texts: list, prosody: dict = None) -> list:
+    """
+    Audio of each text already in the store, whichever voice of its pool read it (None
+    where there is none): one store lookup for all the texts and voices.
+    """
+    stored = iter(await store.get_many_async("tts", [
+        _store_key(voice, text, prosody) for text, text_voices in zip(texts, voices) for voice in text_voices
+    ]))
+    results = []
+    for text_voices in voices:
+        # text_voices first: zip stops before taking an item of the next text
+        found = [audio_data for _, audio_data in zip(text_voices, stored) if audio_data is not None]
+        results.append(found[0] if found else None)
+    return results
+
+def _estimate_audio_size(text: str) -> int:
+    """
+    Rough size of the MP3 for a text (~14 spoken chars per second, plus leading/trailing silence).
+    """
+    return int((len(text) / 14 + 1) * BYTES_PER_SECOND)
+
+@recorder.recordable("tts", is_transient=_is_transient)
+async def _synthesize(text: str, voice: str, boundary: str = "SentenceBoundary", **prosody) -> tuple[bytes, list]:
+    """
+    Runs one Edge TTS session and collects the audio into a pre-sized buffer.
+    `prosody`: rate / pitch / volume adjustments (e.g. rate="-30%").
+    Returns (audio bytes, boundary events).
+    """
+    communicate = edge_tts.Communicate(text, voice, boundary=boundary, **prosody)
+    buffer = bytearray(_estimate_audio_size(text))
+    length = 0
+    boundaries = []
+
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            data = chunk["data"]
+            end = length + len(data)
+            if end > len(buffer):
+                buffer.extend(bytes(max(end - len(buffer), len(buffer) // 2)))
+            buffer[length:end] = data
+            length = end
+        elif chunk["type"] in ("WordBoundary", "SentenceBoundary"):
+            boundaries.append({
+                "text": chunk["text"],
+                "offset": chunk["offset"],
+                "duration": chunk["duration"],
+            })
+
+    del buffer[length:]
+    return bytes(buffer), boundaries
+
+async def _synthesize_hedgeable(text: str, voice: str, **kwargs) -> tuple[bytes, list]:
+    """
+    _synthesize for hedgeable calls: every session takes a slot of its voice, the hedged
+    duplicate and the request left running after losing the race included, so hedges
+    don't push a voice past VOICE_CONCURRENCY sessions. The wait for the slot counts
+    in the attempt's deadline.
+    """
+    async with _voice_slot(voice):
+        return await _synthesize(text, voice, **kwargs)
+
+async def _probe_session(voice: str):
+    async for chunk in edge_tts.Communicate("OK", voice).stream():
+        if chunk["type"] == "audio":
+            return
+    raise edge_tts_errors.NoAudioReceived("No audio received from the probe.")
+
+async def probe(target_language: str, deadline: float = None):
+    """
+    Readiness probe (see warmup.py): one tiny synthesis, outside the recorder and the store,
+    with the retries of the "tts" policy. Raises if no audio comes back.
+    """
+    voice = _get_voice(target_language)
+    await resilience.call(
+        "tts", _probe_session, voice, is_transient=_is_transient, deadline=deadline,
+        breaker_key=_voice_breaker(voice)
+    )
+
+# --- MP3 frame helpers (used to cut a batched session back into utterances) ---
+
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1 Layer III
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],      # MPEG-2/2.5 Layer III
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+def _mp3_frames(audio: bytes) -> list[tuple[int, int]]:
+    """
+    Walks the MP3 frame headers and returns (byte_offset, start_tick) for each frame.
+    Returns an empty list if the data does not look like a Layer III stream.
+    """
+    frames = []
+    pos = 0
+    ticks = 0
+    size = len(audio)
+    while pos + 4 <= size:
+        b1, b2 = audio[pos + 1], audio[pos + 2]
+        version = (b1 >> 3) & 0x03
+        if audio[pos] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1 or ((b1 >> 1) & 0x03) != 1:
+            break
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x03
+        if bitrate_index in (0, 15) or rate_index == 3:
+            break
+        bitrate = _MP3_BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+        samples = 1152 if version == 3 else 576
+        frame_length = (samples // 8) * bitrate // sample_rate + ((b2 >> 1) & 0x01)
+
+        frames.append((pos, ticks))
+        pos += frame_length
+        ticks += samples * TICKS_PER_SECOND // sample_rate
+    return frames
+
+def _split_audio(audio: bytes, cut_ticks: list[int]) -> list[memoryview]:
+    """
+    Cuts an MP3 stream at the given tick positions (snapped to frame boundaries).
+    Returns len(cut_ticks) + 1 segments, as views on `audio` (no copy).
+    """
+    frames = _mp3_frames(audio)
+    cuts = []
+    for tick in cut_ticks:
+        if frames:
+            byte_offset = next((offset for offset, start in frames if start >= tick), len(audio))
+        else:
+            byte_offset = min(len(audio), tick * BYTES_PER_SECOND // TICKS_PER_SECOND)
+        cuts.append(byte_offset)
+
+    view = memoryview(audio)
+    edges = [0] + cuts + [len(audio)]
+    return [view[start:end] for start, end in zip(edges, edges[1:])]
+
+def slice_audio(audio: bytes, start_tick: int, end_tick: int) -> bytes | memoryview:
+    """
+    Cuts the [start_tick, end_tick] window out of an Edge TTS MP3, locally (no network).
+    Ticks are the 100ns units used by the boundary metadata. The clip is a view on
+    `audio` (b"" for an empty window).
+    """
+    if not audio or end_tick <= start_tick:
+        return b""
+    return _split_audio(audio, [max(0, start_tick), end_tick])[1]
+
+def _store_key(voice: str, text: str, prosody: dict = None) -> list:
+    return [voice, text, prosody] if prosody else [voice, text]
+
+# --- Public API ---
+
+async def generate_audio(text: str, target_language: str, prosody: dict = None) -> bytes:
     """
     Generate audio TTS for the given text in the target language, using Microsoft Edge TTS.
+    `prosody`: optional rate / pitch / volume (see PROSODY_VARIANTS).
     Returns raw audio bytes.
     """
-    voice = VOICE_MAPPING.get(target_language.lower(), "en-US-RogerNeural")
+    voices = _get_voices(target_language, text)
+    store = artifact_store.get_store()
+    if store and (stored := (await _find_stored(store, [voices], [text], prosody))[0]) is not None:
+        return stored
     try:
-        communicate = edge_tts.Communicate(text, voice)
-        audio_data = b""
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                audio_data += chunk["data"]
-        
+        # Hedge: a stuck stream is duplicated on a new connection
+        voice, (audio_data, _) = await _on_voices(voices, lambda voice: resilience.call(
+            "tts", _synthesize_hedgeable, text, voice, hedge_args=(text, voice), is_transient=_is_transient,
+            breaker_key=_voice_breaker(voice), **(prosody or {})
+        ), take_slot=False)
+        if store and audio_data:
+            await store.put_async("tts", _store_key(voice, text, prosody), audio_data)
         return audio_data
 
+    except resilience.CircuitOpenError:
+        return b""
+    except Exception as e:
+        print(f"❌ Error TTS for generation for '{text}': {e}")
+        return b""
+
+async def generate_audio_with_timings(text: str, target_language: str) -> tuple[bytes, list]:
+    """
+    Same as generate_audio, but also returns the WordBoundary timings of the stream:
+    a list of {"text", "offset", "duration"} dicts (offsets in 100ns ticks).
+    """
+    voices = _get_voices(target_language, text)
+    store = artifact_store.get_store()
+    if store:
+        stored_timings = await store.get_many_async("tts_timings", [[voice, text] for voice in voices])
+        for voice, timings in zip(voices, stored_timings):
+            audio_data = await store.get_async("tts", [voice, text]) if timings is not None else None
+            if audio_data is not None:
+                return audio_data, json.loads(timings)
+    try:
+        voice, (audio_data, timings) = await _on_voices(voices, lambda voice: resilience.call(
+            "tts", _synthesize_hedgeable, text, voice, boundary="WordBoundary",
+            hedge_args=(text, voice), is_transient=_is_transient, breaker_key=_voice_breaker(voice)
+        ), take_slot=False)
+        if store and audio_data:
+            await store.put_async("tts", [voice, text], audio_data)
+            await store.put_json_async("tts_timings", [voice, text], timings)
+        return audio_data, timings
+
+    except resilience.CircuitOpenError:
+        return b"", []
     except Exception as e:
         print(f"❌ Error TTS for generation for '{text}': {e}")
-        return b""
\ No newline at end of file
+        return b"", []
+
+# Silence kept around an isolated word so the clip doesn't start/end abruptly (50ms)
+WORD_CLIP_PADDING = TICKS_PER_SECOND // 20
+
+def extract_word_clip(audio: bytes, timings: list, word: str) -> bytes | memoryview:
+    """
+    Cuts the clip of `word` (one or several words) out of a sentence audio, using the
+    timings returned by generate_audio_with_timings: a view on `audio` (see slice_audio),
+    or b"" if the word isn't found.
+    """
+    targets = [_normalize(w) for w in word.split() if _normalize(w)]
+    spoken = [_normalize(t["text"]) for t in timings]
+    if not audio or not targets:
+        return b""
+
+    for start in range(len(spoken) - len(targets) + 1):
+        if spoken[start:start + len(targets)] == targets:
+            first, last = timings[start], timings[start + len(targets) - 1]
+            return slice_audio(
+                audio,
+                first["offset"] - WORD_CLIP_PADDING,
+                last["offset"] + last["duration"] + WORD_CLIP_PADDING,
+            )
+    return b""
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\W+", "", text).lower()
+
+def _is_batchable(text: str) -> bool:
+    """
+    A text can share a session only if it is a single sentence (otherwise the
+    sentence boundaries would not map one-to-one to our utterances).
+    """
+    stripped = text.strip().rstrip(SENTENCE_END)
+    return bool(_normalize(text)) and not any(c in SENTENCE_END for c in stripped)
+
+async def _synthesize_group(texts: list[str], voice: str, prosody: dict = None) -> list[memoryview] | None:
+    """
+    Synthesizes several single-sentence texts in one session, then splits the audio
+    on the SentenceBoundary offsets. Returns None if the boundaries don't line up.
+    """
+    utterances = [t.strip() if t.strip()[-1] in SENTENCE_END else f"{t.strip()}." for t in texts]
+    audio, boundaries = await _synthesize("\n".join(utterances), voice, **(prosody or {}))
+
+    if len(boundaries) != len(texts):
+        return None
+    if any(_normalize(b["text"]) != _normalize(t) for b, t in zip(boundaries, utterances)):
+        return None
+
+    # Cut in the middle of the silence between two sentences
+    cut_ticks = [
+        (prev["offset"] + prev["duration"] + nxt["offset"]) // 2
+        for prev, nxt in zip(boundaries, boundaries[1:])
+    ]
+    return _split_audio(audio, cut_ticks)
+
+async def generate_audio_batch(texts: list[str], target_language: str, prosody: dict = None) -> list[bytes | memoryview]:
+    """
+    Generate audio for many short texts, sharing one Edge TTS session per group of texts
+    instead of opening a websocket per text. Repeated texts are synthesized once.
+    Groups are sharded over the voice pool of the language and run concurrently.
+    Returns one audio buffer per input text (b"" on failure), in order; the segments
+    of a session are views on its audio.
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    if len(unique_texts) < len(texts):
+        by_text = dict(zip(unique_texts, await generate_audio_batch(unique_texts, target_language, prosody)))
+        return [by_text[text] for text in texts]
+
+    results = [b""] * len(texts)
+    voices = [_get_voices(target_language, text) for text in texts]
+
+    # Already synthesized by a previous run / another worker
+    store = artifact_store.get_store()
+    stored = set()
+    if store:
+        for index, audio_data in enumerate(await _find_stored(store, voices, texts, prosody)):
+            if texts[index] and audio_data is not None:
+                results[index] = audio_data
+                stored.add(index)
+
+    # Group batchable texts by voice, into sessions of at most BATCH_MAX_CHARS characters
+    groups = []
+    singles = []
+    current = {}    # voice -> (indexes, characters)
+    for index, text in enumerate(texts):
+        if index in stored:
+            continue
+        if not _is_batchable(text):
+            if text:
+                singles.append(index)
+            continue
+        group, chars = current.get(voices[index][0], ([], 0))
+        if group and chars + len(text) > BATCH_MAX_CHARS:
+            groups.append(group)
+            group, chars = [], 0
+        group.append(index)
+        current[voices[index][0]] = (group, chars + len(text))
+    groups.extend(group for group, _ in current.values())
+
+    async def _group(group: list):
+        group_texts = [texts[i] for i in group]
+        try:
+            # Longer sessions get a proportionally longer deadline
+            voice, segments = await _on_voices(voices[group[0]], lambda voice: resilience.call(
+                "tts", _synthesize_group, group_texts, voice, prosody,
+                is_transient=_is_transient, breaker_key=_voice_breaker(voice),
+                deadline=resilience.POLICIES["tts"].deadline + sum(map(len, group_texts)) / 50
+            ))
+        except resilience.CircuitOpenError:
+            return
+        except Exception as e:
+            print(f"⚠️ Batched TTS session failed ({e}), falling back to single requests.")
+            segments = None
+
+        if segments is None:
+            singles.extend(group)
+            return
+        for index, segment in zip(group, segments):
+            results[index] = segment
+        if store:
+            await store.put_many_async("tts", [
+                (_store_key(voice, texts[index], prosody), segment) for index, segment in zip(group, segments) if segment
+            ])
+
+    await asyncio.gather(*(_group(group) for group in groups))
+
+    if singles:
+        semaphore = asyncio.Semaphore(FALLBACK_CONCURRENCY)
+
+        async def _single(index):
+            async with semaphore:
+                results[index] = await generate_audio(texts[index], target_language, prosody)
+
+        await asyncio.gather(*(_single(i) for i in singles))
+
+    return results
+
+async def generate_audio_variants(texts: list[str], target_language: str, variants: dict = None) -> dict:
+    """
+    Prosody variants of many texts (default: PROSODY_VARIANTS), one synthesis batch
+    per variant, all running concurrently. Returns {variant name: [audio bytes per text]}.
+    """
+    variants = PROSODY_VARIANTS if variants is None else variants
+    names = list(variants)
+    batches = await asyncio.gather(*(generate_audio_batch(texts, target_language, variants[name]) for name in names))
+    return dict(zip(names, batches))
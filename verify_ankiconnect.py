@@ -0,0 +1,98 @@
+
+import asyncio
+import base64
+import os
+from aiohttp import web
+
+import anki_creator
+import ankiconnect
+
+# Minimal stand-in for the AnkiConnect add-on: records what it receives
+received = {"decks": [], "models": [], "media": {}, "notes": []}
+
+async def handle(request):
+    payload = await request.json()
+    action, params = payload["action"], payload.get("params", {})
+
+    if action == "createDeck":
+        received["decks"].append(params["deck"])
+        result = 1
+    elif action == "modelNames":
+        result = ["Basic"] + [model["modelName"] for model in received["models"]]
+    elif action == "createModel":
+        received["models"].append(params)
+        result = {}
+    elif action == "storeMediaFile":
+        received["media"][params["filename"]] = base64.b64decode(params["data"])
+        result = params["filename"]
+    elif action == "canAddNotes":
+        # Duplicate = same first field, like Anki
+        existing = {next(iter(note["fields"].values())) for note in received["notes"]}
+        result = [next(iter(note["fields"].values())) not in existing for note in params["notes"]]
+    elif action == "addNotes":
+        received["notes"].extend(params["notes"])
+        result = list(range(len(received["notes"]) - len(params["notes"]) + 1, len(received["notes"]) + 1))
+    else:
+        return web.json_response({"result": None, "error": f"unsupported action {action}"})
+    return web.json_response({"result": result, "error": None})
+
+async def test_ankiconnect_sink():
+    print("Testing AnkiConnect Sink...")
+
+    app = web.Application()
+    app.router.add_post("/", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    try:
+        sink = ankiconnect.AnkiConnectSink("Test AnkiConnect Deck", f"http://127.0.0.1:{port}", batch_size=2)
+        words = [("Maison", "Dom"), ("Chat", "Kot"), ("Chien", "Pies"), ("Maison", "Dom")]  # last one is a duplicate
+        for front, back in words:
+            flashcard = anki_creator.create_flashcard(
+                audio_bytes=b"fake_audio_" + back.encode(),
+                image_bytes=None,
+                front_text=front,
+                back_text=back,
+                mode="translation"
+            )
+            await sink.add(flashcard)
+        media_paths = list(sink.media_files)
+        await sink.close()
+    finally:
+        await runner.cleanup()
+
+    if received["decks"] == ["Test AnkiConnect Deck"]:
+        print("✅ Deck created once.")
+    else:
+        print(f"❌ Unexpected decks: {received['decks']}")
+        exit(1)
+
+    if [model["modelName"] for model in received["models"]] == [anki_creator.MODEL_TRANSLATION.name]:
+        print("✅ Note type created from MODEL_TRANSLATION.")
+    else:
+        print(f"❌ Unexpected note types: {received['models']}")
+        exit(1)
+
+    if len(received["notes"]) == 3 and sink.added == 3 and sink.rejected == 1:
+        print("✅ 3 notes added, duplicate rejected.")
+    else:
+        print(f"❌ Unexpected notes: {len(received['notes'])} received, {sink.added} added, {sink.rejected} rejected")
+        exit(1)
+
+    if received["media"].get(os.path.basename(media_paths[0])) == b"fake_audio_Dom":
+        print("✅ Media uploaded.")
+    else:
+        print(f"❌ Media missing: {list(received['media'])}")
+        exit(1)
+
+    if not any(os.path.exists(path) for path in media_paths):
+        print("✅ Temporary media files removed.")
+    else:
+        print("❌ Temporary media files were left behind.")
+        exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(test_ankiconnect_sink())
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+
+import artifact_store
+
+DAY = 86400
+
+def _age(store, kind: str, parts, seconds: float):
+    """
+    Makes an entry look last used `seconds` ago.
+    """
+    with store._locked(), store._connect() as db:
+        db.execute("UPDATE artifacts SET last_used = ? WHERE key = ?",
+                   (time.time() - seconds, store.make_key(kind, parts)))
+
+def _check(label: str, ok: bool, detail=""):
+    if ok:
+        print(f"✅ {label}")
+    else:
+        print(f"❌ {label}: {detail}")
+        exit(1)
+
+def test_gc_by_age():
+    print("Testing gc by age...")
+    with tempfile.TemporaryDirectory() as root:
+        store = artifact_store.ArtifactStore(root)
+        store.put("tts", ["old"], b"old audio")
+        store.put("tts", ["recent"], b"recent audio")
+        _age(store, "tts", ["old"], 10 * DAY)
+
+        result = store.gc(max_age_days=5)
+        _check("Entry unused for 10 days removed, with its object.",
+               result["entries"] == 1 and result["objects"] == 1 and store.get("tts", ["old"]) is None, result)
+        _check("Recent entry kept.", store.get("tts", ["recent"]) == b"recent audio")
+
+def test_gc_lru():
+    print("Testing gc by size (least recently used first)...")
+    with tempfile.TemporaryDirectory() as root:
+        store = artifact_store.ArtifactStore(root)
+        for name, age in (("a", 300), ("b", 200), ("c", 100)):
+            store.put("image", [name], name.encode() * 100)
+            _age(store, "image", [name], age)
+        # Reading "a" makes it the most recently used
+        store.get("image", ["a"])
+
+        result = store.gc(max_bytes=250)
+        kept = [name for name in "abc" if store.get("image", [name]) is not None]
+        _check("Least recently used entry evicted to fit 250 bytes.", kept == ["a", "c"] and result["bytes"] == 100,
+               (kept, result))
+
+def test_orphan_grace():
+    print("Testing the grace period of unindexed objects...")
+    with tempfile.TemporaryDirectory() as root:
+        store = artifact_store.ArtifactStore(root)
+        # A writer between writing the object and indexing it
+        fresh = store._object_path(store._write_object(b"being written"))
+        stale = store._object_path(store._write_object(b"abandoned"))
+        old = time.time() - artifact_store.ORPHAN_GRACE_SECONDS - 60
+        os.utime(stale, (old, old))
+
+        result = store.gc()
+        _check("Fresh unindexed object kept.", os.path.exists(fresh))
+        _check("Unindexed object older than the grace period removed.",
+               not os.path.exists(stale) and result["objects"] == 1, result)
+
+if __name__ == "__main__":
+    test_gc_by_age()
+    test_gc_lru()
+    test_orphan_grace()
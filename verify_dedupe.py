@@ -0,0 +1,65 @@
+import random
+import string
+
+import dedupe
+
+# Pairs must be found at this rate when their similarity is at or just above the threshold
+MIN_RECALL = 0.95
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8)))
+
+def _near_pairs(rng: random.Random, low: float, high: float, count: int) -> list:
+    """
+    Random phrases and edited copies whose n-gram Jaccard similarity is in [low, high).
+    """
+    pairs = []
+    while len(pairs) < count:
+        words = [_word(rng) for _ in range(rng.randint(3, 6))]
+        edited = list(words)
+        for _ in range(rng.randint(1, 3)):
+            position = rng.randrange(len(edited))
+            if rng.random() < 0.5:
+                edited[position] = _word(rng)
+            else:
+                edited.insert(position, _word(rng))
+        a, b = " ".join(words), " ".join(edited)
+        if low <= dedupe.jaccard(dedupe.shingles(a), dedupe.shingles(b)) < high:
+            pairs.append((a, b))
+    return pairs
+
+def test_recall_at_threshold():
+    print("Testing near-duplicate recall at the threshold...")
+    rng = random.Random(7)
+
+    for threshold in (0.5, 0.6):
+        pairs = _near_pairs(rng, threshold, threshold + 0.2, 400)
+        found = 0
+        for a, b in pairs:
+            index = dedupe.NearDuplicateIndex(threshold=threshold)
+            index.add(a)
+            found += index.find(b) is not None
+        recall = found / len(pairs)
+        if recall >= MIN_RECALL:
+            print(f"✅ Threshold {threshold}: {recall:.1%} of the pairs with similarity {threshold}-{threshold + 0.2:.1f} found.")
+        else:
+            print(f"❌ Threshold {threshold}: only {recall:.1%} of the pairs with similarity {threshold}-{threshold + 0.2:.1f} found.")
+            exit(1)
+
+def test_distinct_items_kept():
+    print("Testing that distinct items are kept...")
+    index = dedupe.NearDuplicateIndex(threshold=0.5)
+    kept, dropped = dedupe.filter_items(
+        [{"source": "Le chien", "target": "Pies"}, {"source": "Un chien", "target": "Pies"},
+         {"source": "La maison", "target": "Dom"}],
+        index, "translation"
+    )
+    if [card["source"] for card in kept] == ["Le chien", "La maison"] and len(dropped) == 1:
+        print("✅ Near-duplicate dropped, distinct item kept.")
+    else:
+        print(f"❌ Unexpected result: kept {kept}, dropped {dropped}")
+        exit(1)
+
+if __name__ == "__main__":
+    test_recall_at_threshold()
+    test_distinct_items_kept()
@@ -0,0 +1,42 @@
+import html_compact
+
+def _check(label: str, got: str, expected: str):
+    if got == expected:
+        print(f"✅ {label}")
+    else:
+        print(f"❌ {label}: expected {expected!r}, got {got!r}")
+        exit(1)
+
+def test_documented_example():
+    print("Testing the documented style -> class example...")
+    html = ("<div style='background-color: #f8f9fa; padding: 10px; border-radius: 5px; "
+            "margin-top: 10px; border-left: 4px solid #3498db;'>Recap</div>")
+    _check("Recap box rewritten to g-recap.", html_compact.compact(html), '<div class="g-recap">Recap</div>')
+
+def test_known_styles():
+    print("Testing the other known styles...")
+    html = """
+    <p style="font-size: 15px">Le <span style='color:#e74c3c'>verbe</span>
+       et le <span class="word" style="COLOR: #3498DB;">nom</span>.</p>
+    <div style='background-color: #f0f0f0; padding: 8px; border-radius: 4px; margin-top: 10px;'>Règle</div>
+    """
+    _check("Spacing and case ignored, existing class kept, whitespace collapsed.", html_compact.compact(html),
+           '<p class="g-body">Le <span class="g-verb">verbe</span> et le <span class="word g-noun">nom</span>.</p>'
+           '<div class="g-box">Règle</div>')
+
+def test_unknown_styles_kept():
+    print("Testing that other inline styles are kept...")
+    # A known declaration plus an extra one is not the known style
+    html = "<span style='color: #e74c3c; font-weight: bold;'>être</span>"
+    _check("Style with an extra declaration kept.", html_compact.compact(html), html)
+
+def test_cleanup():
+    print("Testing the removal of fences, comments and empty elements...")
+    html = "```html\n<div><!-- note --><p> </p><span></span>Texte</div>\n```"
+    _check("Fences, comments and empty elements removed.", html_compact.compact(html), "<div>Texte</div>")
+
+if __name__ == "__main__":
+    test_documented_example()
+    test_known_styles()
+    test_unknown_styles_kept()
+    test_cleanup()
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import resilience
+
+THRESHOLD = 3
+RESET_AFTER = 0.2
+
+resilience.POLICIES["verify"] = resilience.Policy(deadline=1, retries=0, failure_threshold=THRESHOLD, reset_after=RESET_AFTER)
+
+calls = []
+
+async def _fail():
+    calls.append("fail")
+    raise resilience.TransientError("down")
+
+async def _succeed():
+    calls.append("ok")
+    return "ok"
+
+async def _slow_succeed():
+    calls.append("ok")
+    await asyncio.sleep(0.05)
+    return "ok"
+
+async def _outcome(fn, key: str = None) -> str:
+    try:
+        return await resilience.call("verify", fn, breaker_key=key)
+    except resilience.CircuitOpenError:
+        return "open"
+    except resilience.TransientError:
+        return "failed"
+
+def _check(label: str, ok: bool, detail=""):
+    if ok:
+        print(f"✅ {label}")
+    else:
+        print(f"❌ {label}: {detail}")
+        exit(1)
+
+async def _transitions(key: str):
+    breaker = resilience.get_breaker("verify", key)
+
+    outcomes = [await _outcome(_fail, key) for _ in range(THRESHOLD)]
+    _check(f"Opens after {THRESHOLD} consecutive failures.",
+           outcomes == ["failed"] * THRESHOLD and breaker.opened_at is not None, outcomes)
+
+    calls.clear()
+    outcome = await _outcome(_succeed, key)
+    _check("Open: calls fail fast without reaching the backend.", outcome == "open" and not calls, (outcome, calls))
+
+    time.sleep(RESET_AFTER)
+    outcomes = await asyncio.gather(_outcome(_slow_succeed, key), _outcome(_succeed, key), _outcome(_succeed, key))
+    _check("Half-open: a single trial call goes through, the others fail fast.",
+           outcomes == ["ok", "open", "open"] and calls == ["ok"], (outcomes, calls))
+    _check("Trial success closes the circuit.", breaker.opened_at is None and breaker.failures == 0,
+           (breaker.opened_at, breaker.failures))
+
+    for _ in range(THRESHOLD):
+        await _outcome(_fail, key)
+    time.sleep(RESET_AFTER)
+    outcome = await _outcome(_fail, key)
+    _check("Trial failure reopens the circuit.",
+           outcome == "failed" and await _outcome(_succeed, key) == "open", outcome)
+
+def test_breaker_transitions():
+    print("Testing circuit breaker transitions...")
+    asyncio.run(_transitions(None))
+
+def test_keyed_breakers():
+    print("Testing breakers keyed inside a backend (e.g. one per voice)...")
+
+    async def run():
+        for _ in range(THRESHOLD):
+            await _outcome(_fail, "verify:a")
+        return await _outcome(_fail, "verify:a"), await _outcome(_succeed, "verify:b")
+
+    outcomes = asyncio.run(run())
+    _check("An open key doesn't block the other keys.", outcomes == ("open", "ok"), outcomes)
+
+if __name__ == "__main__":
+    test_breaker_transitions()
+    test_keyed_breakers()
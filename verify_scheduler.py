@@ -0,0 +1,125 @@
+import asyncio
+
+from scheduler import StageScheduler, Task
+
+WORKERS = {"llm": 2, "tts": 2}
+
+async def _noop():
+    pass
+
+def _run(plans, timeout: float = 5.0):
+    """
+    Runs the plans; returns the raised error (None if the run succeeded).
+    A hang is reported as a TimeoutError.
+    """
+    async def main():
+        await asyncio.wait_for(StageScheduler(WORKERS, max_in_flight=4).run(plans), timeout)
+    try:
+        asyncio.run(main())
+    except BaseException as e:
+        return e
+    return None
+
+def test_dependencies_respected():
+    print("Testing that tasks run after their dependencies...")
+    order = []
+
+    def plan(card: int) -> dict:
+        async def step(name):
+            await asyncio.sleep(0.01)
+            order.append((card, name))
+        return {
+            "text": Task("llm", lambda: step("text")),
+            "audio": Task("tts", lambda: step("audio"), deps=["text"]),
+        }
+
+    error = _run(plan(card) for card in range(6))
+    misplaced = [card for card in range(6) if order.index((card, "text")) > order.index((card, "audio"))]
+    if error is None and len(order) == 12 and not misplaced:
+        print("✅ 6 cards done, every audio task after its text task.")
+    else:
+        print(f"❌ Unexpected result: error {error!r}, order {order}")
+        exit(1)
+
+def test_failure_propagates():
+    print("Testing that a failing task fails the run...")
+
+    async def boom():
+        raise ValueError("no audio")
+
+    plans = [{"text": Task("llm", _noop), "audio": Task("tts", boom, deps=["text"])} for _ in range(3)]
+    error = _run(plans)
+    if isinstance(error, ValueError) and str(error) == "no audio":
+        print("✅ The task's ValueError is raised by run().")
+    else:
+        print(f"❌ Expected the ValueError, got {error!r}")
+        exit(1)
+
+def test_cancelled_shared_future():
+    print("Testing a task awaiting a cancelled shared future...")
+
+    async def main():
+        shared = asyncio.get_running_loop().create_future()
+
+        async def wait_shared():
+            await shared
+
+        async def cancel_shared():
+            await asyncio.sleep(0.01)
+            shared.cancel()
+
+        plans = [{"rule": Task("llm", wait_shared)}, {"cancel": Task("tts", cancel_shared)}]
+        await asyncio.wait_for(StageScheduler(WORKERS).run(plans), 5.0)
+
+    try:
+        asyncio.run(main())
+        error = None
+    except BaseException as e:
+        error = e
+    if isinstance(error, RuntimeError) and isinstance(error.__cause__, asyncio.CancelledError):
+        print(f"✅ Run failed instead of hanging: {error}")
+    else:
+        print(f"❌ Expected a RuntimeError caused by the cancellation, got {error!r}")
+        exit(1)
+
+def test_plan_error_propagates():
+    print("Testing an error while building the plans...")
+
+    def plans():
+        yield {"text": Task("llm", _noop)}
+        raise KeyError("bad row")
+
+    error = _run(plans())
+    if isinstance(error, KeyError):
+        print("✅ The plan generator's KeyError is raised by run().")
+    else:
+        print(f"❌ Expected the KeyError, got {error!r}")
+        exit(1)
+
+def test_run_cancelled():
+    print("Testing that cancelling the run stops its workers...")
+
+    async def main():
+        scheduler = StageScheduler(WORKERS)
+        run = asyncio.create_task(scheduler.run([{"text": Task("llm", lambda: asyncio.sleep(10))}]))
+        await asyncio.sleep(0.05)
+        run.cancel()
+        try:
+            await run
+        except asyncio.CancelledError:
+            return "cancelled"
+        return "finished"
+
+    result = asyncio.run(asyncio.wait_for(main(), 5.0))
+    if result == "cancelled":
+        print("✅ The run was cancelled.")
+    else:
+        print(f"❌ The run {result} instead of being cancelled.")
+        exit(1)
+
+if __name__ == "__main__":
+    test_dependencies_respected()
+    test_failure_propagates()
+    test_cancelled_shared_future()
+    test_plan_error_propagates()
+    test_run_cancelled()
@@ -0,0 +1,86 @@
+import tts_call
+
+# MPEG-2 Layer III, 48 kbit/s, 24 kHz, mono (the Edge TTS format): 144-byte frames of 24ms
+FRAME_HEADER = bytes([0xFF, 0xF3, 0x64, 0xC4])
+FRAME_BYTES = 144
+FRAME_TICKS = 576 * tts_call.TICKS_PER_SECOND // 24000
+FRAME_COUNT = 50
+
+def _synthetic_mp3() -> bytes:
+    """
+    FRAME_COUNT frames, the payload of frame i filled with the byte i (to tell them apart).
+    """
+    return b"".join(FRAME_HEADER + bytes([i]) * (FRAME_BYTES - len(FRAME_HEADER)) for i in range(FRAME_COUNT))
+
+def _frame_indexes(segment) -> list:
+    return [segment[offset + len(FRAME_HEADER)] for offset in range(0, len(segment), FRAME_BYTES)]
+
+def test_frames_parsed():
+    print("Testing MP3 frame parsing...")
+    frames = tts_call._mp3_frames(_synthetic_mp3())
+    expected = [(i * FRAME_BYTES, i * FRAME_TICKS) for i in range(FRAME_COUNT)]
+    if frames == expected:
+        print(f"✅ {FRAME_COUNT} frames of {FRAME_BYTES} bytes / {FRAME_TICKS} ticks found.")
+    else:
+        print(f"❌ Unexpected frames: {frames[:3]}... ({len(frames)} frames)")
+        exit(1)
+
+def test_split_on_frame_boundaries():
+    print("Testing that the audio is cut on frame boundaries...")
+    audio = _synthetic_mp3()
+    # The first cut falls inside frame 10: it snaps to the start of frame 11
+    segments = tts_call._split_audio(audio, [10 * FRAME_TICKS + 1, 30 * FRAME_TICKS])
+    indexes = [_frame_indexes(segment) for segment in segments]
+    if indexes != [list(range(0, 11)), list(range(11, 30)), list(range(30, FRAME_COUNT))]:
+        print(f"❌ Unexpected segments: {[(i[0], i[-1]) for i in indexes if i]}")
+        exit(1)
+    if b"".join(segments) != audio or not all(isinstance(segment, memoryview) for segment in segments):
+        print("❌ The segments are not views covering the whole audio.")
+        exit(1)
+    print("✅ 3 segments cut at frames 11 and 30, as views on the audio.")
+
+def test_slice_audio():
+    print("Testing slice_audio...")
+    audio = _synthetic_mp3()
+    clip = tts_call.slice_audio(audio, 5 * FRAME_TICKS, 8 * FRAME_TICKS)
+    empty = tts_call.slice_audio(audio, 8 * FRAME_TICKS, 5 * FRAME_TICKS)
+    if _frame_indexes(clip) == [5, 6, 7] and empty == b"":
+        print("✅ Frames 5-7 sliced, empty window gives b''.")
+    else:
+        print(f"❌ Unexpected clip: {_frame_indexes(clip)}, empty window: {bytes(empty)!r}")
+        exit(1)
+
+def test_extract_word_clip():
+    print("Testing extract_word_clip...")
+    audio = _synthetic_mp3()
+    timings = [
+        {"text": "Ala", "offset": 0, "duration": 10 * FRAME_TICKS},
+        {"text": "ma", "offset": 12 * FRAME_TICKS, "duration": 5 * FRAME_TICKS},
+        {"text": "kota.", "offset": 20 * FRAME_TICKS, "duration": 15 * FRAME_TICKS},
+    ]
+    clip = tts_call.extract_word_clip(audio, timings, "Kota")
+    # 50ms of padding on both sides: from frame 17.9 (-> 18) to frame 37.1 (-> 38)
+    if _frame_indexes(clip) != list(range(18, 38)):
+        print(f"❌ Unexpected clip for 'Kota': frames {_frame_indexes(clip)}")
+        exit(1)
+    if tts_call.extract_word_clip(audio, timings, "psa") != b"":
+        print("❌ A word not in the sentence should give b''.")
+        exit(1)
+    print("✅ Word clip cut with its padding; missing word gives b''.")
+
+def test_not_mp3():
+    print("Testing the fallback for data that isn't MP3...")
+    audio = bytes(2 * tts_call.BYTES_PER_SECOND)
+    segments = tts_call._split_audio(audio, [tts_call.TICKS_PER_SECOND // 2])
+    if [len(segment) for segment in segments] == [tts_call.BYTES_PER_SECOND // 2, 3 * tts_call.BYTES_PER_SECOND // 2]:
+        print("✅ Cut by the estimated byte rate.")
+    else:
+        print(f"❌ Unexpected segment sizes: {[len(segment) for segment in segments]}")
+        exit(1)
+
+if __name__ == "__main__":
+    test_frames_parsed()
+    test_split_on_frame_boundaries()
+    test_slice_audio()
+    test_extract_word_clip()
+    test_not_mp3()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+import vocab_import
+
+def _write(directory: str, name: str, content: str) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+def _check(label: str, got, expected):
+    if got == expected:
+        print(f"✅ {label}")
+    else:
+        print(f"❌ {label}: expected {expected}, got {got}")
+        exit(1)
+
+def test_csv_tsv_header():
+    print("Testing CSV / TSV files with a header...")
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = _write(directory, "words.csv", "Target,Source\nkot,chat\npies,chien\n")
+        rows = [vocab_import.to_item(row, "translation", ["pl"]) for row in vocab_import.iter_rows(csv_path)]
+        _check("CSV header columns used by name.", rows,
+               [{"source": "chat", "target": "kot"}, {"source": "chien", "target": "pies"}])
+
+        tsv_path = _write(directory, "words.tsv", "source\tpl\tde\nchat\tkot\tKatze\n")
+        rows = [vocab_import.to_item(row, "translation", ["pl", "de"])
+                for row in vocab_import.iter_rows(tsv_path, languages=["pl", "de"])]
+        _check("TSV header with language columns.", rows,
+               [{"source": "chat", "targets": {"pl": "kot", "de": "Katze"}}])
+
+def test_csv_without_header():
+    print("Testing CSV files without a header...")
+    with tempfile.TemporaryDirectory() as directory:
+        # 'translation' is a column name, 'word' is not: this first row is data
+        path = _write(directory, "words.csv", "word,translation\nkot,chat\n")
+        rows = [vocab_import.to_item(row, "translation", ["pl"]) for row in vocab_import.iter_rows(path)]
+        _check("First row kept as data.", rows,
+               [{"source": "word", "target": "translation"}, {"source": "kot", "target": "chat"}])
+
+        path = _write(directory, "forced.csv", "source,target\nchat,kot\n")
+        rows = list(vocab_import.iter_rows(path, header=False))
+        _check("--no-header keeps a row that looks like a header.", rows, [["source", "target"], ["chat", "kot"]])
+
+        path = _write(directory, "custom.csv", "mot,traduction\nchat,kot\n")
+        rows = list(vocab_import.iter_rows(path, header=True))
+        _check("--header takes unknown names as a header.", rows, [{"mot": "chat", "traduction": "kot"}])
+
+def test_jsonl():
+    print("Testing JSONL files...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = _write(directory, "words.jsonl", '{"source": "chat", "target": "kot"}\n\n{"source": "chien", "target": null}\n')
+        _check("JSONL rows read, null as empty.", list(vocab_import.iter_rows(path)),
+               [{"source": "chat", "target": "kot"}, {"source": "chien", "target": ""}])
+
+        path = _write(directory, "bad.jsonl", '{"source": "chat", "target": "kot"}\n["chien", "pies"]\n')
+        try:
+            list(vocab_import.iter_rows(path))
+            error = None
+        except ValueError as e:
+            error = str(e)
+        _check("Non-object line rejected with its line number.", error, f"{path}:2: expected a JSON object")
+
+if __name__ == "__main__":
+    test_csv_tsv_header()
+    test_csv_without_header()
+    test_jsonl()
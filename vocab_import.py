@@ -0,0 +1,171 @@
+"""
+Vocabulary import (--input FILE): builds decks from existing word lists instead of
+asking the LLM for one.
+
+CSV, TSV and JSONL files are read row by row, so lists of any size can be used.
+Columns are the keys of the mode's generate_vocab items (source, target, translation,
+or sentence_fr, sentence_pl_masked... for declension); with several targets, one
+"target_<lang>" (or "<lang>") column per language. A CSV/TSV file without header row
+takes the mode's columns in that order: the first row is only taken as a header when
+all its names are known columns (--header / --no-header decide instead).
+
+Empty cells are left out of the deck, unless --fill is given: the rows missing a
+column are then completed by llm_call.complete_vocab, in batches sent while the rest
+of the file is still being read.
+"""
+import asyncio
+import csv
+import json
+import os
+
+import llm_call
+
+MODE_COLUMNS = {
+    "translation": ("source", "target"),
+    "listening": ("source", "target"),
+    "custom": ("source", "target"),
+    "cloze": ("source", "target", "translation"),
+    "declension": ("sentence_fr", "sentence_pl_masked", "root_word", "declined_word", "case_name_source", "case_name_target"),
+}
+
+# Columns that may stay empty
+OPTIONAL_COLUMNS = {"translation"}
+
+# complete_vocab requests running at once
+FILL_CONCURRENCY = 4
+
+def _is_header(names: list, languages=()) -> bool:
+    known = set(name for columns in MODE_COLUMNS.values() for name in columns) | set(languages)
+    names = [name for name in names if name]
+    return bool(names) and all(name in known or name.startswith("target_") for name in names)
+
+def iter_rows(path: str, header: bool = None, languages=()):
+    """
+    Yields the rows of a CSV / TSV / JSONL file as dicts of strings (header names as
+    keys), or lists for a CSV / TSV file without header. `header` None: the first row
+    is a header if all its names are columns (or one of the target `languages`).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if extension in (".jsonl", ".ndjson"):
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError(f"{path}:{lineno}: expected a JSON object")
+                yield {key: "" if value is None else str(value) for key, value in row.items()}
+            return
+
+        reader = csv.reader(f, delimiter="\t" if extension in (".tsv", ".tab") else ",")
+        first = next(reader, None)
+        if first is None:
+            return
+        names = [name.strip().lower() for name in first]
+        if not (header if header is not None else _is_header(names, languages)):
+            # No header: the first line is already data
+            yield first
+            yield from reader
+            return
+        for row in reader:
+            yield dict(zip(names, row))
+
+def _columns(mode: str, targets: list) -> list:
+    columns = MODE_COLUMNS[mode]
+    if len(targets) == 1:
+        return list(columns)
+    # Multi-target: source, then one column per language
+    return [column for column in columns if column != "target"] + [f"target_{lang}" for lang in targets]
+
+def to_item(row, mode: str, targets: list) -> dict:
+    """
+    One vocab item (generate_vocab shape, or generate_vocab_multi shape with several
+    targets), empty strings where the row has no value.
+    """
+    if isinstance(row, list):
+        row = dict(zip(_columns(mode, targets), row))
+
+    def value(*names) -> str:
+        return next((row[name].strip() for name in names if row.get(name)), "")
+
+    if len(targets) == 1:
+        item = {column: value(column) for column in MODE_COLUMNS[mode]}
+        if mode != "declension" and not item["target"]:
+            item["target"] = value(f"target_{targets[0]}", targets[0])
+        return item
+
+    item = {column: value(column) for column in MODE_COLUMNS[mode] if column != "target"}
+    item["targets"] = {lang: value(f"target_{lang}", lang) for lang in targets}
+    return item
+
+def is_complete(item: dict) -> bool:
+    """
+    Every required column is set (with several targets, at least one language:
+    split_multi_vocab skips the others).
+    """
+    if not all(value for key, value in item.items() if key not in OPTIONAL_COLUMNS and key != "targets"):
+        return False
+    return "targets" not in item or any(item["targets"].values())
+
+def has_gaps(item: dict) -> bool:
+    return not all(value for key, value in item.items() if key != "targets") \
+        or not all(item.get("targets", {}).values())
+
+def scan(path: str, mode: str, targets: list, limit: int = None, header: bool = None) -> dict:
+    """
+    Row counts of the file, for --dry-run: rows, rows with empty columns (sent to
+    --fill), and rows usable as they are.
+    """
+    counts = {"rows": 0, "gaps": 0, "complete": 0}
+    for row in iter_rows(path, header, targets):
+        if limit is not None and counts["rows"] >= limit:
+            break
+        item = to_item(row, mode, targets)
+        counts["rows"] += 1
+        counts["gaps"] += has_gaps(item)
+        counts["complete"] += is_complete(item)
+    return counts
+
+async def load_vocab(path: str, mode: str, source_lang: str, targets: list, fill: bool = False, limit: int = None,
+                     header: bool = None) -> list:
+    """
+    The vocab items of an imported file (at most `limit`). With `fill`, the empty columns
+    are completed by the LLM; rows still missing a required column are skipped.
+    """
+    items = []
+    filled = 0
+    pending = []        # indexes of the rows waiting for the next completion batch
+    batches = []
+    semaphore = asyncio.Semaphore(FILL_CONCURRENCY)
+
+    async def complete(indexes: list):
+        async with semaphore:
+            completed = await llm_call.complete_vocab([items[i] for i in indexes], source_lang, targets, mode)
+        for index, item in zip(indexes, completed):
+            items[index] = item
+
+    for row in iter_rows(path, header, targets):
+        if limit is not None and len(items) >= limit:
+            break
+        items.append(to_item(row, mode, targets))
+        if fill and has_gaps(items[-1]):
+            filled += 1
+            pending.append(len(items) - 1)
+            if len(pending) >= llm_call.COMPLETION_BATCH_SIZE:
+                batches.append(asyncio.create_task(complete(pending)))
+                pending = []
+        if len(items) % 1000 == 0:
+            # Let the completion requests go out while the file is being read
+            await asyncio.sleep(0)
+    if pending:
+        batches.append(asyncio.create_task(complete(pending)))
+
+    if batches:
+        print(f"⏳ (Gemini) Filling the empty columns of {filled} rows ({len(batches)} requests)...")
+        await asyncio.gather(*batches)
+
+    vocab = [item for item in items if is_complete(item)]
+    if len(vocab) < len(items):
+        print(f"⚠️ {len(items) - len(vocab)} rows with empty columns skipped{'' if fill else ' (use --fill to complete them)'}.")
+    print(f"✅ Imported {len(vocab)} cards from '{os.path.basename(path)}'.")
+    return vocab
@@ -0,0 +1,97 @@
+"""
+Backend warm-up and readiness probing, while the vocabulary is being generated.
+
+Every backend the run needs is started in parallel: the Gemini client, an Edge TTS
+session, DuckDuckGo, and the espeak worker processes. The readiness and latency of
+each one is reported (TTS per target language), and the pipeline stages of the
+backends that aren't ready are disabled up front (cards are built without them)
+instead of failing card after card.
+Network probes go through the resilience layer with the stage's own policy: a
+transient failure is retried, not taken as the backend being down.
+"""
+import asyncio
+import time
+
+import events
+import image_api
+import ipa
+import llm_call
+import recorder
+import tts_call
+
+# Seconds per probe attempt (network probes are retried like the stage's own calls,
+# under its resilience policy) before a backend is considered unavailable
+PROBE_TIMEOUT = 15
+
+# Pipeline stage (main.STAGE_WORKERS) served by each backend
+BACKEND_STAGES = {"gemini": "llm", "tts": "tts", "image": "image", "ipa": "ipa"}
+
+def needed_backends(args) -> dict:
+    """
+    {backend: probe coroutine function} for the backends this run uses. Per-language
+    backends are named "<backend>:<lang>" (TTS).
+    """
+    probes = {}
+    # A generated list already goes through Gemini first: only imported lists need the probe
+    if args.input and (args.explain or args.mode == "declension"):
+        probes["gemini"] = lambda: llm_call.probe(deadline=PROBE_TIMEOUT)
+    if args.mode != "custom":
+        # One probe per language: a language without a working voice only disables its own audio
+        for lang in args.targets:
+            probes[f"tts:{lang}"] = lambda lang=lang: tts_call.probe(lang, deadline=PROBE_TIMEOUT)
+    if args.mode == "translation":
+        probes["image"] = lambda: image_api.probe(deadline=PROBE_TIMEOUT)
+    if args.mode in ("translation", "listening"):
+        # Local: no retry, only a time limit
+        probes["ipa"] = lambda: asyncio.wait_for(ipa.get_engine().warm_up(args.targets), timeout=PROBE_TIMEOUT)
+    return probes
+
+async def _probe(name: str, fn) -> dict:
+    started = time.perf_counter()
+    try:
+        await fn()
+        result = {"ready": True, "error": None}
+    except asyncio.TimeoutError:
+        result = {"ready": False, "error": f"no answer within {PROBE_TIMEOUT}s"}
+    except Exception as e:
+        result = {"ready": False, "error": str(e) or type(e).__name__}
+    result["latency"] = time.perf_counter() - started
+    events.emit("backend_ready", backend=name, ready=result["ready"], latency=round(result["latency"], 3), error=result["error"])
+    return result
+
+async def probe_backends(args) -> dict:
+    """
+    Probes the backends of this run concurrently. Returns {backend: {"ready", "latency", "error"}}.
+    Network backends aren't probed while replaying a recording.
+    """
+    probes = needed_backends(args)
+    if recorder.is_replaying():
+        probes = {name: fn for name, fn in probes.items() if name == "ipa"}
+    results = await asyncio.gather(*(_probe(name, fn) for name, fn in probes.items()))
+    return dict(zip(probes, results))
+
+def _stage(name: str) -> str:
+    return BACKEND_STAGES[name.split(":")[0]]
+
+def disabled_stages(readiness: dict, target_lang: str) -> set:
+    """
+    The stages to leave out of the `target_lang` deck: those of the backends that aren't
+    ready, per-language backends only for their own language.
+    """
+    disabled = set()
+    for name, result in readiness.items():
+        backend, _, lang = name.partition(":")
+        if not result["ready"] and lang in ("", target_lang):
+            disabled.add(BACKEND_STAGES[backend])
+    return disabled
+
+def print_report(readiness: dict):
+    if not readiness:
+        return
+    print("🔥 Backends:")
+    for name, result in readiness.items():
+        if result["ready"]:
+            print(f"   ✅ {name:<7} ready in {result['latency']:.2f}s")
+        else:
+            print(f"   ❌ {name:<7} unavailable ({result['error']}): '{_stage(name)}' stage disabled"
+                  + (f" for {name.partition(':')[2]}" if ":" in name else ""))